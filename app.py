@@ -15,11 +15,49 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USER', 'root')}:{os.getenv('DB_PASSWORD', '')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'comsoc_attendance')}"
+# DATABASE_URL overrides the MySQL settings (e.g. sqlite:///bench.db for benchmarks)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or f"mysql+pymysql://{os.getenv('DB_USER', 'root')}:{os.getenv('DB_PASSWORD', '')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'comsoc_attendance')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 0 keeps the whole masterlist cached; a positive value bounds it (LRU)
+app.config['STUDENT_CACHE_MAX_ENTRIES'] = int(os.getenv('STUDENT_CACHE_MAX_ENTRIES', 0))
+# Scan ingestion: 'sync' commits each scan, 'write_behind' queues and batches them
+app.config['SCAN_INGEST_MODE'] = os.getenv('SCAN_INGEST_MODE', 'sync')
+app.config['SCAN_FLUSH_INTERVAL_MS'] = int(os.getenv('SCAN_FLUSH_INTERVAL_MS', 200))
+app.config['SCAN_FLUSH_BATCH_SIZE'] = int(os.getenv('SCAN_FLUSH_BATCH_SIZE', 500))
+app.config['SCAN_SPOOL_PATH'] = os.getenv('SCAN_SPOOL_PATH', os.path.join(app.instance_path, 'scan_spool.jsonl'))
+app.config['SCAN_SPOOL_FSYNC'] = os.getenv('SCAN_SPOOL_FSYNC', 'false').lower() == 'true'
+# Detail rows per page on the report pages
+app.config['REPORT_PAGE_SIZE'] = int(os.getenv('REPORT_PAGE_SIZE', 100))
+# Students per keyset page on the attendance views and roster JSON
+app.config['ATTENDANCE_PAGE_SIZE'] = int(os.getenv('ATTENDANCE_PAGE_SIZE', 200))
+# Dashboard counters: full recount period, and the minimum gap between recounts after writes
+app.config['DASHBOARD_RECONCILE_SECONDS'] = int(os.getenv('DASHBOARD_RECONCILE_SECONDS', 300))
+app.config['DASHBOARD_MIN_RECONCILE_SECONDS'] = int(os.getenv('DASHBOARD_MIN_RECONCILE_SECONDS', 10))
+# Full rebuild period of the in-process student search index (0 disables)
+app.config['STUDENT_SEARCH_REFRESH_SECONDS'] = int(os.getenv('STUDENT_SEARCH_REFRESH_SECONDS', 300))
+# Live attendance stream: messages buffered per client before it must resync, and keepalive period
+app.config['SSE_CLIENT_BUFFER'] = int(os.getenv('SSE_CLIENT_BUFFER', 256))
+app.config['SSE_HEARTBEAT_SECONDS'] = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+# Report cache: memory tier for rendered pages, disk tier for export files (0 disables a tier)
+app.config['REPORT_CACHE_MEMORY_MB'] = int(os.getenv('REPORT_CACHE_MEMORY_MB', 32))
+app.config['REPORT_CACHE_DISK_MB'] = int(os.getenv('REPORT_CACHE_DISK_MB', 512))
+app.config['REPORT_CACHE_DIR'] = os.getenv('REPORT_CACHE_DIR', os.path.join(app.instance_path, 'report_cache'))
+# Background Excel exports: worker threads, and how long finished files stay downloadable
+app.config['EXPORT_JOB_WORKERS'] = int(os.getenv('EXPORT_JOB_WORKERS', 2))
+app.config['EXPORT_JOB_TTL_SECONDS'] = int(os.getenv('EXPORT_JOB_TTL_SECONDS', 3600))
+app.config['EXPORT_JOB_DIR'] = os.getenv('EXPORT_JOB_DIR', os.path.join(app.instance_path, 'export_jobs'))
+# Threads fetching record sheets in parallel for the per-record event workbook (?layout=sheets)
+app.config['EXPORT_SHEET_WORKERS'] = int(os.getenv('EXPORT_SHEET_WORKERS', 4))
 
 # Import models first
 from models import db, Student, Event, AttendanceRecord, Attendance
+from services.student_cache import student_cache
+from services.scan_ingest import scan_ingestor
+from services.dashboard_counters import dashboard_counters
+from services.student_search import student_search
+from services.live_updates import live_updates
+from services.report_cache import report_cache
+from services.export_jobs import export_jobs
 
 # Initialize database
 db.init_app(app)
@@ -44,5 +82,26 @@ app.register_blueprint(reports_bp, url_prefix='/reports')
 with app.app_context():
     db.create_all()
 
+# Track dashboard counters from committed writes
+dashboard_counters.init_app(app)
+
+# Index cached export files and size the report cache tiers
+report_cache.init_app(app)
+
+# Run large exports in background jobs
+export_jobs.init_app(app)
+
+# Push committed attendance changes to live record viewers
+live_updates.init_app(app)
+
+# Warm the student roster cache used by the scanner
+student_cache.init_app(app)
+
+# Build the student search index and keep it in sync with commits
+student_search.init_app(app)
+
+# Start the write-behind scan flusher when enabled (replays any leftover spool)
+scan_ingestor.init_app(app)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
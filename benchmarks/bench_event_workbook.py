@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event Excel export, flat sheet vs. one sheet per record
+
+Builds an event with many sessions (records) and times the flat single
+sheet export against the multi-sheet workbook (?layout=sheets) with one
+and with several sheet workers. Worker threads overlap the database round
+trips of the next records with writing the current sheet, so the gain
+grows with query latency: run it against MySQL (DATABASE_URL) for
+production-like numbers.
+
+Usage: python benchmarks/bench_event_workbook.py [students] [records] [workers]
+"""
+
+import os
+import sys
+from common import load_app, reset_database, seed_students, create_record, timer
+
+
+def flat_export(event_id, workers):
+    from services.exports import excel_report_file, event_rows_query, EVENT_HEADERS
+    return excel_report_file("Event Report", lambda total: ["Event Report", f"Total Students: {total}"],
+                             EVENT_HEADERS, event_rows_query(event_id))
+
+
+def sheets_export(event_id, workers):
+    from services.exports import event_workbook_file
+    return event_workbook_file(event_id, lambda total: ["Event Report", f"Total Students: {total}"], workers)
+
+
+def measure(label, export, event_id, workers, rows):
+    from models import db
+    db.session.expunge_all()
+    with timer() as elapsed:
+        path = export(event_id, workers)
+    size = os.path.getsize(path)
+    os.remove(path)
+    print(f"{label:<12} {workers:>7} {rows:>8} {elapsed['elapsed']:>8.2f} {size / 2**20:>9.2f}")
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    records = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    app = load_app()
+
+    from models import db, AttendanceRecord
+    from services.attendance_store import initialize_roster
+
+    with app.app_context():
+        reset_database()
+        seed_students(students)
+        first_record = create_record('Session 1')
+        event_id = db.session.get(AttendanceRecord, first_record).event_id
+        record_ids = [first_record]
+        for number in range(2, records + 1):
+            record = AttendanceRecord(record_name=f'Session {number}', event_id=event_id)
+            db.session.add(record)
+            db.session.flush()
+            record_ids.append(record.record_id)
+        for record_id in record_ids:
+            initialize_roster(record_id)
+        db.session.commit()
+
+        rows = students * records
+        print(f"{'layout':<12} {'workers':>7} {'rows':>8} {'seconds':>8} {'file MiB':>9}")
+        measure('flat', flat_export, event_id, 1, rows)
+        measure('sheets', sheets_export, event_id, 1, rows)
+        measure('sheets', sheets_export, event_id, workers, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event Excel export, in-memory workbook vs. write-only streaming
+
+The legacy path is the original export_event_excel body: ORM rows collected
+into a list, a normal Workbook, then a width pass over every cell. Peak Python
+memory is measured with tracemalloc in a second, untimed run.
+
+Usage: python benchmarks/bench_excel_export.py [rows per record] [records]
+"""
+
+import io
+import os
+import sys
+import tracemalloc
+from common import load_app, reset_database, seed_students, create_record, timer
+
+
+def legacy_export(event_id):
+    """The original export_event_excel body, kept here for comparison"""
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+    from models import AttendanceRecord
+
+    attendance_data = []
+    for record in AttendanceRecord.query.filter_by(event_id=event_id).all():
+        for attendance in record.attendances:
+            attendance_data.append({
+                'student_id': attendance.student_id,
+                'student_fname': attendance.student_fname,
+                'student_year_level': attendance.student_year_level,
+                'student_course': attendance.student_course,
+                'status': attendance.status,
+                'timestamp': attendance.timestamp,
+                'record_name': record.record_name
+            })
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws['A1'] = "Event Report"
+    ws['A4'] = f"Total Students: {len(attendance_data)}"
+    headers = ['Student ID', 'First Name', 'Year Level', 'Course', 'Status', 'Timestamp', 'Record']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=6, column=col, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    for row, attendance in enumerate(attendance_data, 7):
+        ws.cell(row=row, column=1, value=attendance['student_id'])
+        ws.cell(row=row, column=2, value=attendance['student_fname'])
+        ws.cell(row=row, column=3, value=attendance['student_year_level'])
+        ws.cell(row=row, column=4, value=attendance['student_course'])
+        ws.cell(row=row, column=5, value=attendance['status'])
+        ws.cell(row=row, column=6, value=attendance['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if attendance['timestamp'] else '')
+        ws.cell(row=row, column=7, value=attendance['record_name'])
+    for column in ws.columns:
+        max_length = max(len(str(cell.value)) for cell in column)
+        ws.column_dimensions[get_column_letter(column[0].column)].width = min(max_length + 2, 50)
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getbuffer().nbytes
+
+
+def streaming_export(event_id):
+    from services.exports import excel_report_file, event_rows_query, EVENT_HEADERS
+    path = excel_report_file("Event Report", lambda total: ["Event Report", f"Total Students: {total}"],
+                             EVENT_HEADERS, event_rows_query(event_id))
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size
+
+
+def measure(label, export, event_id, rows):
+    """Time one run, then repeat it under tracemalloc for the memory peak"""
+    from models import db
+    db.session.expunge_all()
+    with timer() as elapsed:
+        size = export(event_id)
+    db.session.expunge_all()
+    tracemalloc.start()
+    export(event_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {rows:>8} {elapsed['elapsed']:>8.2f} {peak / 2**20:>10.1f} {size / 2**20:>9.2f}")
+
+
+def main():
+    per_record = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    records = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    app = load_app()
+
+    from models import db, AttendanceRecord
+    from services.attendance_store import initialize_roster
+
+    with app.app_context():
+        reset_database()
+        seed_students(per_record)
+        first_record = create_record('Session 1')
+        event_id = db.session.get(AttendanceRecord, first_record).event_id
+        record_ids = [first_record]
+        for number in range(2, records + 1):
+            record = AttendanceRecord(record_name=f'Session {number}', event_id=event_id)
+            db.session.add(record)
+            db.session.flush()
+            record_ids.append(record.record_id)
+        for record_id in record_ids:
+            initialize_roster(record_id)
+        db.session.commit()
+
+        rows = per_record * records
+        print(f"{'path':<10} {'rows':>8} {'seconds':>8} {'peak MiB':>10} {'file MiB':>9}")
+        measure('legacy', legacy_export, event_id, rows)
+        measure('streaming', streaming_export, event_id, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: initializing an attendance record with the whole roster
+
+Compares the old per-student SELECT + INSERT loop with the set-based
+initialize_roster() helper. The statement count of the set-based path stays
+constant as the roster grows.
+
+Usage: python benchmarks/bench_initialize_record.py [roster sizes...]
+"""
+
+import sys
+from common import load_app, reset_database, seed_students, create_record, count_statements, timer
+
+LEGACY_LIMIT = 5000  # the old loop gets slow quickly, skip it beyond this size
+
+
+def legacy_initialize(record_id):
+    """The original initialize_record loop, kept here for comparison"""
+    from models import db, Student, Attendance
+    inserted = 0
+    for student in Student.query.all():
+        existing = Attendance.query.filter_by(record_id=record_id, student_id=student.student_id).first()
+        if not existing:
+            db.session.add(Attendance(
+                record_id=record_id,
+                student_id=student.student_id,
+                student_fname=student.fname,
+                student_year_level=student.year_level,
+                student_course=student.course,
+                status='Absent'
+            ))
+            inserted += 1
+    db.session.commit()
+    return inserted
+
+
+def bulk_initialize(record_id):
+    from models import db
+    from services.attendance_store import initialize_roster
+    inserted, _ = initialize_roster(record_id)
+    db.session.commit()
+    return inserted
+
+
+def run(size, label, initializer):
+    reset_database()
+    seed_students(size)
+    record_id = create_record()
+    with count_statements() as counter, timer() as elapsed:
+        inserted = initializer(record_id)
+    ms = elapsed['elapsed'] * 1000
+    print(f"{label:<8} {size:>8} {inserted:>9} {counter['statements']:>11} {ms:>10.1f} {ms * 1000 / max(size, 1):>9.2f}")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 5000, 20000, 50000]
+    app = load_app()
+    with app.app_context():
+        print(f"{'path':<8} {'roster':>8} {'inserted':>9} {'statements':>11} {'total ms':>10} {'us/row':>9}")
+        for size in sizes:
+            if size <= LEGACY_LIMIT:
+                run(size, 'legacy', legacy_initialize)
+            run(size, 'bulk', bulk_initialize)
+
+
+if __name__ == '__main__':
+    main()
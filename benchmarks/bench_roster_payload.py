@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: roster JSON payload, list of objects vs. ?format=compact
+
+Fetches a whole record through /attendance/record/<id>/students in pages of
+1000 (the maximum), once per format, and prints the bytes sent and the
+server time. The "legacy" row is the original endpoint body: every ORM
+object of the record turned into a dict and passed to jsonify. A second
+table times serialization alone for the whole record held in memory.
+
+Usage: python benchmarks/bench_roster_payload.py [students]
+"""
+
+import sys
+import json
+from common import load_app, reset_database, seed_students, create_record, timer
+
+
+def legacy_roster(record_id):
+    """The original get_students_for_record body, kept here for comparison"""
+    from flask import jsonify
+    from models import AttendanceRecord, Attendance
+    record = AttendanceRecord.query.get_or_404(record_id)
+    attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
+    students = [{
+        'student_id': a.student_id,
+        'student_fname': a.student_fname,
+        'student_year_level': a.student_year_level,
+        'student_course': a.student_course,
+        'status': a.status
+    } for a in attendances]
+    return len(jsonify({'success': True, 'record_id': record.record_id, 'students': students}).get_data())
+
+
+def fetch_all(client, record_id, query=''):
+    """Walk every page, return (bytes received, pages)"""
+    size, pages, cursor = 0, 0, ''
+    while True:
+        response = client.get(f'/attendance/record/{record_id}/students?limit=1000&cursor={cursor}{query}')
+        size += len(response.get_data())
+        pages += 1
+        cursor = response.get_json()['next_cursor']
+        if not cursor:
+            return size, pages
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    app = load_app()
+
+    from models import db
+    from services.attendance_store import initialize_roster
+
+    with app.app_context():
+        reset_database()
+        seed_students(count)
+        record_id = create_record()
+        initialize_roster(record_id)
+        db.session.commit()
+        client = app.test_client()
+
+        print(f"{'format':<10} {'students':>9} {'pages':>6} {'KiB':>9} {'seconds':>8}")
+        with app.test_request_context():
+            with timer() as elapsed:
+                size = legacy_roster(record_id)
+        db.session.expunge_all()
+        print(f"{'legacy':<10} {count:>9} {1:>6} {size / 1024:>9.1f} {elapsed['elapsed']:>8.3f}")
+        for label, query in (('objects', ''), ('compact', '&format=compact')):
+            with timer() as elapsed:
+                size, pages = fetch_all(client, record_id, query)
+            print(f"{label:<10} {count:>9} {pages:>6} {size / 1024:>9.1f} {elapsed['elapsed']:>8.3f}")
+
+        from services.attendance_pages import attendance_page
+        from services.compact_json import compact_payload
+        from blueprints.attendance import ROSTER_COLUMNS
+        rows, _ = attendance_page(record_id, limit=count, columns=ROSTER_COLUMNS)
+        print(f"\n{'serialize':<10} {'KiB':>9} {'seconds':>8}")
+        with timer() as elapsed:
+            body = json.dumps({'success': True, 'students': [dict(row._mapping) for row in rows]},
+                              separators=(',', ':'))
+        print(f"{'objects':<10} {len(body) / 1024:>9.1f} {elapsed['elapsed']:>8.3f}")
+        with timer() as elapsed:
+            body = json.dumps(compact_payload(rows, ROSTER_COLUMNS, ('student_year_level', 'student_course'),
+                                              'status'), separators=(',', ':'))
+        print(f"{'compact':<10} {len(body) / 1024:>9.1f} {elapsed['elapsed']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scans/sec through /scanner/process-qr, sync vs. write-behind
+
+Several threads play scanner stations and post badge scans as fast as they
+can. For write-behind mode two rates are printed: acknowledged scans/sec
+(what the stations see) and durable scans/sec (including the final flush).
+
+Usage: python benchmarks/bench_scan_ingest.py [scans] [stations]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from common import load_app, reset_database, seed_students, create_record, timer
+
+
+def run_stations(client_factory, record_id, student_ids, stations):
+    """Split the scans across `stations` threads and wait for all of them"""
+    errors = []
+
+    def station(ids):
+        client = client_factory()
+        for student_id in ids:
+            response = client.post('/scanner/process-qr', json={'qr_data': student_id, 'record_id': record_id})
+            if not response.get_json().get('success'):
+                errors.append(response.get_json().get('message'))
+
+    threads = [threading.Thread(target=station, args=(student_ids[i::stations],)) for i in range(stations)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def main():
+    scans = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    stations = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    app = load_app()
+
+    from models import Attendance
+    from services.student_cache import student_cache
+    from services.scan_ingest import scan_ingestor, SYNC, WRITE_BEHIND
+
+    print(f"{scans} scans from {stations} stations")
+    print(f"{'mode':<14} {'ack s':>8} {'ack scans/s':>12} {'durable scans/s':>16} {'rows':>6} {'errors':>7}")
+    for mode in (SYNC, WRITE_BEHIND):
+        with app.app_context():
+            reset_database()
+            student_ids = seed_students(scans)
+            record_id = create_record()
+            student_cache.warm()
+
+        app.config['SCAN_INGEST_MODE'] = mode
+        app.config['SCAN_SPOOL_PATH'] = os.path.join(tempfile.mkdtemp(prefix='scan_spool_'), 'spool.jsonl')
+        scan_ingestor.init_app(app)
+
+        with timer() as durable:
+            with timer() as acknowledged:
+                errors = run_stations(app.test_client, record_id, student_ids, stations)
+            scan_ingestor.stop()
+
+        with app.app_context():
+            rows = Attendance.query.filter_by(record_id=record_id, status='Present').count()
+        ack_rate = scans / acknowledged['elapsed']
+        durable_rate = scans / durable['elapsed']
+        print(f"{mode:<14} {acknowledged['elapsed']:>8.2f} {ack_rate:>12.0f} {durable_rate:>16.0f} {rows:>6} {len(errors):>7}")
+
+
+if __name__ == '__main__':
+    main()
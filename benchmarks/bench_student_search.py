@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: student search, four LIKE '%q%' filters vs. the in-process index
+
+Runs a mix of typical queries (id fragments, names, courses, short and
+missing terms) through the original SQL filter and through
+services.student_search, checks both return the same students, and prints
+the per-query latency. A second table times the top-10 typeahead lookups
+behind /scanner/lookup. Finally the full list (empty q) is fetched from
+/students/search in both JSON formats and checked against the table.
+
+Usage: python benchmarks/bench_student_search.py [students] [repeats]
+"""
+
+import sys
+from common import load_app, reset_database, seed_students, timer
+
+QUERIES = ['B0012345', 'B00123', '0099', 'Student 4242', 'dent 77', 'BSEMC', 'bsi', '3', 'zz', 'nobody']
+TYPEAHEAD = ['b', 'b00', 'b001234', 'stu', 'student 99', '4242', 'zz']
+
+
+def legacy_search(query):
+    """The original students.search filter, kept here for comparison"""
+    from models import Student
+    return Student.query.filter(
+        (Student.student_id.contains(query)) |
+        (Student.fname.contains(query)) |
+        (Student.year_level.contains(query)) |
+        (Student.course.contains(query))
+    ).order_by(Student.student_id).all()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    app = load_app()
+
+    from models import db
+    from services.student_search import student_search
+
+    with app.app_context():
+        reset_database()
+        seed_students(count)
+        with timer() as build:
+            student_search.rebuild()
+        print(f"Index build for {count} students: {build['elapsed']:.2f}s")
+
+        print(f"{'query':<14} {'matches':>8} {'sql ms':>9} {'index ms':>9} {'first result':>14}")
+        for query in QUERIES:
+            with timer() as sql:
+                for _ in range(repeats):
+                    expected = legacy_search(query)
+                    db.session.expunge_all()
+            with timer() as index:
+                for _ in range(repeats):
+                    found = student_search.search(query)
+            if sorted(s.student_id for s in found) != [s.student_id for s in expected]:
+                print(f"MISMATCH for {query!r}: sql={len(expected)} index={len(found)}")
+                return 1
+            first = found[0].student_id if found else '-'
+            print(f"{query!r:<14} {len(found):>8} {sql['elapsed'] / repeats * 1000:>9.2f} "
+                  f"{index['elapsed'] / repeats * 1000:>9.2f} {first:>14}")
+
+        print(f"\n{'typeahead':<14} {'results':>8} {'us':>9} {'first result':>14}")
+        for query in TYPEAHEAD:
+            with timer() as lookup:
+                for _ in range(repeats * 100):
+                    found = student_search.complete(query, 10)
+            first = found[0].student_id if found else '-'
+            print(f"{query!r:<14} {len(found):>8} {lookup['elapsed'] / (repeats * 100) * 1e6:>9.1f} {first:>14}")
+
+        client = app.test_client()
+        print(f"\n{'full list':<14} {'students':>8} {'KiB':>9} {'ms':>9}")
+        for label, query in (('objects', ''), ('compact', '&format=compact')):
+            with timer() as fetch:
+                response = client.get(f'/students/search?q={query}', headers={'Accept': 'application/json'})
+            payload = response.get_json()
+            if response.status_code != 200 or not payload['success']:
+                print(f"FAILED {label} list: HTTP {response.status_code}")
+                return 1
+            listed = payload['columns']['student_id'] if 'columns' in payload else \
+                [student['student_id'] for student in payload['students']]
+            if len(listed) != count or listed != sorted(listed):
+                print(f"MISMATCH for the {label} list: {len(listed)} of {count} students")
+                return 1
+            print(f"{label:<14} {len(listed):>8} {len(response.get_data()) / 1024:>9.1f} "
+                  f"{fetch['elapsed'] * 1000:>9.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
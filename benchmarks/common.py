@@ -0,0 +1,91 @@
+"""
+Shared helpers for the benchmark scripts
+
+The benchmarks run against a scratch SQLite database unless DATABASE_URL
+is already set (point it at a MySQL instance for production-like numbers).
+"""
+
+import os
+import sys
+import time
+import tempfile
+from contextlib import contextmanager
+
+# Make the project root importable when run as `python benchmarks/<script>.py`
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def load_app():
+    """Import the Flask app, defaulting to a throwaway SQLite database"""
+    if not os.getenv('DATABASE_URL'):
+        scratch_dir = tempfile.mkdtemp(prefix='attendance_bench_')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+    from app import app
+    return app
+
+
+def reset_database():
+    """Drop and recreate every table"""
+    from models import db
+    db.drop_all()
+    db.create_all()
+
+
+def seed_students(count, prefix='B'):
+    """Insert `count` synthetic students with a multi-row insert"""
+    from sqlalchemy import insert
+    from models import db, Student
+    courses = ['BSCS', 'BSIT', 'BSIS', 'BSEMC']
+    rows = [{
+        'student_id': f'{prefix}{i:07d}',
+        'fname': f'Student {i}',
+        'year_level': f'{i % 4 + 1}',
+        'course': courses[i % len(courses)]
+    } for i in range(count)]
+    db.session.execute(insert(Student), rows)
+    db.session.commit()
+    return [row['student_id'] for row in rows]
+
+
+def create_record(name='Benchmark Record'):
+    """Create an event with one attendance record and return the record id"""
+    from datetime import date
+    from models import db, Event, AttendanceRecord
+    event = Event(event_name=f'{name} Event', event_date=date.today())
+    db.session.add(event)
+    db.session.flush()
+    record = AttendanceRecord(record_name=name, event_id=event.event_id)
+    db.session.add(record)
+    db.session.commit()
+    return record.record_id
+
+
+@contextmanager
+def count_statements():
+    """Count SQL statements sent to the database inside the block"""
+    from sqlalchemy import event
+    from models import db
+    counter = {'statements': 0}
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['statements'] += 1
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+
+@contextmanager
+def timer():
+    """Measure wall time of the block in seconds"""
+    result = {'elapsed': 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['elapsed'] = time.perf_counter() - start
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Concurrency check: many stations hammering one attendance record
+
+Phase 1 scans the same few badges from every thread at once against a record
+with no rows yet, so every scan races to insert. Phase 2 toggles the same
+badges from every thread. With the atomic upsert and conditional UPDATE paths
+there must be no errors, exactly one row per student, and each student's final
+status must match the parity of the number of toggles it received.
+
+Usage: python benchmarks/stress_scan_upsert.py [threads] [iterations]
+Exits non-zero if any check fails.
+"""
+
+import sys
+import threading
+from common import load_app, reset_database, seed_students, create_record, timer
+
+HOT_BADGES = 5
+
+
+def hammer(app, worker, iterations):
+    """Run `worker(client, i)` from several threads and collect failures"""
+    failures = []
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+
+    def run():
+        client = app.test_client()
+        for i in range(iterations):
+            message = worker(client, i)
+            if message:
+                failures.append(message)
+
+    threads = [threading.Thread(target=run) for _ in range(threads_count)]
+    with timer() as elapsed:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return failures, threads_count * iterations, elapsed['elapsed']
+
+
+def main():
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    app = load_app()
+
+    from sqlalchemy import func
+    from models import db, Attendance
+    from services.student_cache import student_cache
+
+    with app.app_context():
+        reset_database()
+        badges = seed_students(HOT_BADGES)
+        record_id = create_record()
+        student_cache.warm()
+
+    def scan(client, i):
+        response = client.post('/scanner/process-qr', json={'qr_data': badges[i % HOT_BADGES], 'record_id': record_id})
+        body = response.get_json()
+        return None if body.get('success') else body.get('message')
+
+    failures, total, elapsed = hammer(app, scan, iterations)
+    print(f"scan:   {total} requests in {elapsed:.2f}s, {len(failures)} failures")
+
+    toggle_counts = {badge: 0 for badge in badges}
+    counts_lock = threading.Lock()
+
+    def toggle(client, i):
+        badge = badges[i % HOT_BADGES]
+        response = client.post(f'/scanner/quick-mark/{record_id}/toggle/{badge}')
+        body = response.get_json()
+        if not body.get('success'):
+            return body.get('message')
+        with counts_lock:
+            toggle_counts[badge] += 1
+        return None
+
+    toggle_failures, total, elapsed = hammer(app, toggle, iterations)
+    failures += toggle_failures
+    print(f"toggle: {total} requests in {elapsed:.2f}s, {len(toggle_failures)} failures")
+
+    with app.app_context():
+        duplicates = db.session.query(Attendance.student_id)\
+            .filter(Attendance.record_id == record_id)\
+            .group_by(Attendance.student_id)\
+            .having(func.count() > 1).count()
+        statuses = dict(db.session.query(Attendance.student_id, Attendance.status)
+                        .filter(Attendance.record_id == record_id))
+
+    # Every row starts Present after phase 1, so an odd toggle count ends Absent
+    wrong_parity = [badge for badge, count in toggle_counts.items()
+                    if statuses.get(badge) != ('Absent' if count % 2 else 'Present')]
+    print(f"rows: {len(statuses)} (expected {HOT_BADGES}), duplicates: {duplicates}, wrong parity: {len(wrong_parity)}")
+
+    for message in sorted(set(failures))[:5]:
+        print(f"  failure: {message}")
+    ok = not failures and not duplicates and not wrong_parity and len(statuses) == HOT_BADGES
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
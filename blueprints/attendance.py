@@ -1,9 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, make_response, Response
 from models import AttendanceRecord, Attendance, Student, db
+from services.attendance_pages import attendance_page, total_count, page_size_arg, record_versions, changes_page, snapshot_match
+from services.student_search import student_search
+from services.live_updates import live_updates
+from services.conditional import conditional, record_marker, record_search_marker
+from services.compact_json import wants_compact, compact_payload, json_response
+from services.attendance_store import initialize_roster, set_status, bulk_set_status, set_statuses, KEEP_TIMESTAMP, ATTENDANCE_STATUSES
 from datetime import datetime
 
 attendance_bp = Blueprint('attendance', __name__)
 
+# Attendance columns served by the roster JSON endpoint
+ROSTER_COLUMNS = ('student_id', 'student_fname', 'student_year_level', 'student_course', 'status')
+
 @attendance_bp.route('/')
 def index():
     """Display all attendance records"""
@@ -11,12 +20,43 @@ def index():
     return render_template('attendance/index.html', records=records)
 
 @attendance_bp.route('/record/<int:record_id>')
+@conditional(record_marker, args=('cursor', 'limit'))
 def view_record(record_id):
-    """View attendance for a specific record"""
+    """View attendance for a specific record, one keyset page at a time (?cursor=, ?limit=)"""
     record = AttendanceRecord.query.get_or_404(record_id)
-    attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
+    limit = page_size_arg()
+    attendances, next_cursor = attendance_page(record_id, request.args.get('cursor'), limit)
+    total = total_count(record_id, cursor=request.args.get('cursor'))
     
-    return render_template('attendance/view_record.html', record=record, attendances=attendances)
+    return _paged_page(record, attendances, next_cursor, limit, total)
+
+def _paged_page(record, attendances, next_cursor, limit, total, **context):
+    """Render view_record.html for one page and expose the total as X-Total-Count"""
+    response = make_response(render_template('attendance/view_record.html',
+                                              record=record,
+                                              attendances=attendances,
+                                              cursor=request.args.get('cursor'),
+                                              next_cursor=next_cursor,
+                                              page_size=limit,
+                                              total_count=total,
+                                              live_url=url_for('attendance.live_record', record_id=record.record_id),
+                                              **context))
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
+
+@attendance_bp.route('/record/<int:record_id>/live')
+def live_record(record_id):
+    """Server-sent events stream of attendance changes on a record"""
+    AttendanceRecord.query.get_or_404(record_id)
+    # Subscribe before returning so nothing committed after this point is missed
+    subscriber = live_updates.subscribe(record_id)
+    response = Response(live_updates.stream(subscriber), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(lambda: live_updates.unsubscribe(subscriber))
+    return response
 
 @attendance_bp.route('/record/<int:record_id>/update', methods=['POST'])
 def update_attendance(record_id):
@@ -34,15 +74,12 @@ def update_attendance(record_id):
     if not all([student_id, status]):
         return jsonify({'success': False, 'message': 'Missing required fields'})
     
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first()
-    
-    if not attendance:
-        return jsonify({'success': False, 'message': 'Attendance record not found'})
-    
     try:
-        attendance.status = status
-        if status == 'Present':
-            attendance.timestamp = datetime.now()
+        # Only a Present mark refreshes the timestamp
+        timestamp = datetime.now() if status == 'Present' else KEEP_TIMESTAMP
+        if not set_status(record_id, student_id, status, timestamp):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Attendance record not found'})
         db.session.commit()
         return jsonify({'success': True, 'message': 'Attendance updated successfully'})
     except Exception as e:
@@ -54,34 +91,20 @@ def initialize_record(record_id):
     """Initialize attendance record with all students"""
     record = AttendanceRecord.query.get_or_404(record_id)
     
-    # Get all students
-    students = Student.query.all()
-    
     try:
-        for student in students:
-            # Check if attendance record already exists
-            existing_attendance = Attendance.query.filter_by(
-                record_id=record_id, 
-                student_id=student.student_id
-            ).first()
-            
-            if not existing_attendance:
-                # Create attendance record for this student
-                new_attendance = Attendance(
-                    record_id=record_id,
-                    student_id=student.student_id,
-                    student_fname=student.fname,
-                    student_year_level=student.year_level,
-                    student_course=student.course,
-                    status='Absent'
-                )
-                db.session.add(new_attendance)
-        
+        # Insert every missing student in one set-based statement
+        inserted, elapsed = initialize_roster(record_id)
         db.session.commit()
+        message = f'Attendance record initialized: {inserted} students added in {elapsed * 1000:.1f} ms'
         # Return JSON if requested by fetch (web version), otherwise flash+redirect
         if 'application/json' in (request.headers.get('Accept') or ''):
-            return jsonify({'success': True, 'message': 'Attendance record initialized with all students'})
-        flash('Attendance record initialized with all students', 'success')
+            return jsonify({
+                'success': True,
+                'message': message,
+                'inserted': inserted,
+                'elapsed_ms': round(elapsed * 1000, 1)
+            })
+        flash(message, 'success')
     except Exception as e:
         db.session.rollback()
         if 'application/json' in (request.headers.get('Accept') or ''):
@@ -93,44 +116,44 @@ def initialize_record(record_id):
 @attendance_bp.route('/record/<int:record_id>/mark-present/<student_id>', methods=['POST'])
 def mark_present(record_id, student_id):
     """Mark a student as present"""
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first_or_404()
-    
     try:
-        attendance.status = 'Present'
-        attendance.timestamp = datetime.now()
+        updated = set_status(record_id, student_id, 'Present', datetime.now())
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Student marked as present'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error marking student as present: {str(e)}'})
+    
+    if not updated:
+        abort(404)
+    return jsonify({'success': True, 'message': 'Student marked as present'})
 
 @attendance_bp.route('/record/<int:record_id>/mark-absent/<student_id>', methods=['POST'])
 def mark_absent(record_id, student_id):
     """Mark a student as absent"""
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first_or_404()
-    
     try:
-        attendance.status = 'Absent'
-        attendance.timestamp = None
+        updated = set_status(record_id, student_id, 'Absent', None)
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Student marked as absent'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error marking student as absent: {str(e)}'})
+    
+    if not updated:
+        abort(404)
+    return jsonify({'success': True, 'message': 'Student marked as absent'})
 
 @attendance_bp.route('/record/<int:record_id>/mark-excused/<student_id>', methods=['POST'])
 def mark_excused(record_id, student_id):
     """Mark a student as excused"""
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first_or_404()
-    
     try:
-        attendance.status = 'Excused'
-        attendance.timestamp = datetime.now()
+        updated = set_status(record_id, student_id, 'Excused', datetime.now())
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Student marked as excused'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error marking student as excused: {str(e)}'})
+    
+    if not updated:
+        abort(404)
+    return jsonify({'success': True, 'message': 'Student marked as excused'})
 
 @attendance_bp.route('/record/<int:record_id>/bulk-update', methods=['POST'])
 def bulk_update(record_id):
@@ -141,259 +164,141 @@ def bulk_update(record_id):
     # Also support a single-status bulk update used by web_version quick_mark
     single_status = data.get('status')
     
+    if single_status and single_status not in ATTENDANCE_STATUSES:
+        return jsonify({'success': False, 'message': 'Invalid status'})
+    
     try:
         if single_status:
-            # Update all attendances for this record to the given status
-            for attendance in Attendance.query.filter_by(record_id=record_id).all():
-                attendance.status = single_status
-                if single_status == 'Present':
-                    attendance.timestamp = datetime.now()
-                elif single_status == 'Absent':
-                    attendance.timestamp = None
-                else:
-                    attendance.timestamp = datetime.now()
+            # Update all attendances for this record in one statement
+            timestamp = None if single_status == 'Absent' else datetime.now()
+            updated = bulk_set_status(record_id, single_status, timestamp)
+            skipped = 0
         else:
-            for update in updates:
-                student_id = update.get('student_id')
-                status = update.get('status')
-                
-                if student_id and status:
-                    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first()
-                    if attendance:
-                        attendance.status = status
-                        if status == 'Present':
-                            attendance.timestamp = datetime.now()
-                        elif status == 'Absent':
-                            attendance.timestamp = None
+            updated, skipped = set_statuses(
+                record_id,
+                ((update.get('student_id'), update.get('status')) for update in updates),
+                datetime.now()
+            )
         
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Bulk update completed successfully'})
+        return jsonify({
+            'success': True,
+            'message': f'Bulk update completed successfully ({updated} updated)',
+            'updated': updated,
+            'skipped': skipped
+        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error during bulk update: {str(e)}'})
 
 @attendance_bp.route('/record/<int:record_id>/search')
+@conditional(record_search_marker, args=('q', 'cursor', 'limit'))
 def search_attendance(record_id):
-    """Search attendance records"""
+    """Search attendance records, one keyset page at a time"""
     record = AttendanceRecord.query.get_or_404(record_id)
     query = request.args.get('q', '')
+    limit = page_size_arg()
     
     if query:
-        attendances = Attendance.query.filter(
-            Attendance.record_id == record_id,
-            (Attendance.student_id.contains(query)) |
-            (Attendance.student_fname.contains(query)) |
-            (Attendance.student_year_level.contains(query)) |
-            (Attendance.student_course.contains(query))
-        ).order_by(Attendance.student_id).all()
+        # Rows keep the student's fields from when they were written; match those
+        candidates = student_search.matching_ids(query, include_snapshots=True)
+        attendances, next_cursor = attendance_page(record_id, request.args.get('cursor'), limit,
+                                                   condition=snapshot_match(query), student_ids=candidates)
+        # Counting matches would cost another scan, so no total for searches
+        total = None
     else:
-        attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
+        attendances, next_cursor = attendance_page(record_id, request.args.get('cursor'), limit)
+        total = total_count(record_id, cursor=request.args.get('cursor'))
     
-    return render_template('attendance/view_record.html', record=record, attendances=attendances, search_query=query)
+    return _paged_page(record, attendances, next_cursor, limit, total, search_query=query)
 
 @attendance_bp.route('/record/<int:record_id>/filter')
+@conditional(record_marker, args=('status', 'cursor', 'limit'))
 def filter_attendance(record_id):
-    """Filter attendance records by status"""
+    """Filter attendance records by status, one keyset page at a time"""
     record = AttendanceRecord.query.get_or_404(record_id)
     status_filter = request.args.get('status', 'all')
+    limit = page_size_arg()
+    status = None if status_filter == 'all' else status_filter
     
-    if status_filter == 'all':
-        attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
-    else:
-        attendances = Attendance.query.filter_by(record_id=record_id, status=status_filter).order_by(Attendance.student_id).all()
+    attendances, next_cursor = attendance_page(record_id, request.args.get('cursor'), limit, status=status)
+    total = total_count(record_id, status, cursor=request.args.get('cursor'))
     
-    return render_template('attendance/view_record.html', record=record, attendances=attendances, status_filter=status_filter)
+    return _paged_page(record, attendances, next_cursor, limit, total, status_filter=status_filter)
 
 @attendance_bp.route('/record/<int:record_id>/students')
+@conditional(record_marker, args=('cursor', 'limit', 'format'))
 def get_students_for_record(record_id):
-    """Return JSON list of students for a record with current attendance status (web version helper)."""
-    record = AttendanceRecord.query.get_or_404(record_id)
-    attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
-    students = [{
-        'student_id': a.student_id,
-        'student_fname': a.student_fname,
-        'student_year_level': a.student_year_level,
-        'student_course': a.student_course,
-        'status': a.status
-    } for a in attendances]
-    return jsonify({'success': True, 'record_id': record.record_id, 'students': students})
-
-    except Exception as e:
-
-        db.session.rollback()
-
-        return jsonify({'success': False, 'message': f'Error marking student as present: {str(e)}'})
-
-
-
-@attendance_bp.route('/record/<int:record_id>/mark-absent/<student_id>', methods=['POST'])
-
-def mark_absent(record_id, student_id):
-
-    """Mark a student as absent"""
-
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first_or_404()
-
-    
-
-    try:
-
-        attendance.status = 'Absent'
-
-        attendance.timestamp = None
-
-        db.session.commit()
-
-        return jsonify({'success': True, 'message': 'Student marked as absent'})
-
-    except Exception as e:
-
-        db.session.rollback()
-
-        return jsonify({'success': False, 'message': f'Error marking student as absent: {str(e)}'})
-
-
-
-@attendance_bp.route('/record/<int:record_id>/mark-excused/<student_id>', methods=['POST'])
-
-def mark_excused(record_id, student_id):
-
-    """Mark a student as excused"""
-
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first_or_404()
-
-    
-
-    try:
-
-        attendance.status = 'Excused'
-
-        attendance.timestamp = datetime.now()
-
-        db.session.commit()
-
-        return jsonify({'success': True, 'message': 'Student marked as excused'})
-
-    except Exception as e:
-
-        db.session.rollback()
-
-        return jsonify({'success': False, 'message': f'Error marking student as excused: {str(e)}'})
-
-
-
-@attendance_bp.route('/record/<int:record_id>/bulk-update', methods=['POST'])
-
-def bulk_update(record_id):
-
-    """Bulk update attendance status"""
+    """Return JSON list of students for a record with current attendance status (web version helper).
 
+    Keyset-paginated on student_id: pass the returned next_cursor as ?cursor= to get the
+    next page; next_cursor is null on the last page. The record total is in X-Total-Count;
+    a later page leaves it out (total null) if the record changed since the totals were counted.
+    ?format=compact returns column arrays instead (see services.compact_json).
+    """
     record = AttendanceRecord.query.get_or_404(record_id)
-
-    updates = request.json.get('updates', [])
-
-    
-
-    try:
-
-        for update in updates:
-
-            student_id = update.get('student_id')
-
-            status = update.get('status')
-
-            
-
-            if student_id and status:
-
-                attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first()
-
-                if attendance:
-
-                    attendance.status = status
-
-                    if status == 'Present':
-
-                        attendance.timestamp = datetime.now()
-
-                    elif status == 'Absent':
-
-                        attendance.timestamp = None
-
-        
-
-        db.session.commit()
-
-        return jsonify({'success': True, 'message': 'Bulk update completed successfully'})
-
-    except Exception as e:
-
-        db.session.rollback()
-
-        return jsonify({'success': False, 'message': f'Error during bulk update: {str(e)}'})
-
-
-
-@attendance_bp.route('/record/<int:record_id>/search')
-
-def search_attendance(record_id):
-
-    """Search attendance records"""
-
-    record = AttendanceRecord.query.get_or_404(record_id)
-
-    query = request.args.get('q', '')
-
-    
-
-    if query:
-
-        attendances = Attendance.query.filter(
-
-            Attendance.record_id == record_id,
-
-            (Attendance.student_id.contains(query)) |
-
-            (Attendance.student_fname.contains(query)) |
-
-            (Attendance.student_year_level.contains(query)) |
-
-            (Attendance.student_course.contains(query))
-
-        ).order_by(Attendance.student_id).all()
-
+    limit = page_size_arg()
+    # Read the version first: anything written after it is picked up by /changes
+    versions = record_versions(record_id)
+    version = versions.change_version
+    attendances, next_cursor = attendance_page(record_id, request.args.get('cursor'), limit,
+                                               columns=ROSTER_COLUMNS)
+    total = total_count(record_id, cursor=request.args.get('cursor'), versions=versions)
+    page_info = {
+        'record_id': record.record_id,
+        'next_cursor': next_cursor,
+        'total': total,
+        'version': version
+    }
+    if wants_compact():
+        payload = compact_payload(attendances, ROSTER_COLUMNS,
+                                  categorical=('student_year_level', 'student_course'),
+                                  status_field='status', **page_info)
     else:
-
-        attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
-
-    
-
-    return render_template('attendance/view_record.html', record=record, attendances=attendances, search_query=query)
-
-
-
-@attendance_bp.route('/record/<int:record_id>/filter')
-
-def filter_attendance(record_id):
-
-    """Filter attendance records by status"""
-
-    record = AttendanceRecord.query.get_or_404(record_id)
-
-    status_filter = request.args.get('status', 'all')
-
+        payload = {'success': True, 'students': [dict(a._mapping) for a in attendances], **page_info}
+    response = json_response(payload)
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    return response
+
+@attendance_bp.route('/record/<int:record_id>/changes')
+@conditional(record_marker, args=('since', 'after', 'limit'))
+def record_changes(record_id):
+    """Return rows changed since ?since=<version> for polling clients.
+
+    Poll with the returned version. While has_more is true, call again with
+    since=version&after=<after> to get the rest. since=0 (or none) returns the
+    whole record. A since older than the last row removal, or newer than the
+    record, gets resync_required and the client should start over from 0.
+    """
+    since = request.args.get('since', 0, type=int)
+    after = request.args.get('after', '')
+    versions = record_versions(record_id)
+    if versions is None:
+        abort(404)
     
-
-    if status_filter == 'all':
-
-        attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
-
-    else:
-
-        attendances = Attendance.query.filter_by(record_id=record_id, status=status_filter).order_by(Attendance.student_id).all()
-
+    if since and (since < versions.resync_version or since > versions.change_version):
+        return jsonify({
+            'success': False,
+            'resync_required': True,
+            'version': versions.change_version,
+            'message': f'Changes since version {since} are not available, refetch the record'
+        })
     
-
-    return render_template('attendance/view_record.html', record=record, attendances=attendances, status_filter=status_filter)
-
-
+    rows, more = changes_page(record_id, since, after, page_size_arg())
+    return jsonify({
+        'success': True,
+        'record_id': record_id,
+        'version': rows[-1].row_version if more else versions.change_version,
+        'has_more': more,
+        'after': rows[-1].student_id if more else None,
+        'changes': [{
+            'student_id': a.student_id,
+            'student_fname': a.student_fname,
+            'student_year_level': a.student_year_level,
+            'student_course': a.student_course,
+            'status': a.status,
+            'timestamp': a.timestamp.isoformat() if a.timestamp else None,
+            'version': a.row_version
+        } for a in rows]
+    })
@@ -1,11 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app, abort
 from models import Student, Event, AttendanceRecord, Attendance, db
+from services.exports import (
+    csv_response, excel_report_file, event_workbook_file, excel_response, file_response, iter_export_rows,
+    record_rows_query, event_rows_query, RECORD_HEADERS, EVENT_HEADERS, XLSX_MIMETYPE
+)
+from services.dashboard_counters import dashboard_counters
+from services.conditional import conditional, cache_slot, record_marker, event_marker
+from services.report_cache import report_cache
+from services.export_jobs import export_jobs, QUEUED, RUNNING, FAILED, FINISHED
+from services.report_stats import parse_breakdown, record_statistics, event_statistics, record_page, event_page
 from datetime import datetime, timedelta
-import csv
-import io
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -17,313 +21,252 @@ def index():
     
     return render_template('reports/index.html', events=events, records=records)
 
+def _page_args():
+    """Page number and size from the query string"""
+    per_page = request.args.get('per_page', current_app.config.get('REPORT_PAGE_SIZE', 100), type=int)
+    return request.args.get('page', 1, type=int), min(max(per_page, 1), 1000)
+
+def _serialize_rows(rows):
+    """Detail rows as JSON-ready dicts"""
+    return [dict(row._mapping, timestamp=row.timestamp.isoformat() if row.timestamp else None) for row in rows]
+
 @reports_bp.route('/event/<int:event_id>')
+@conditional(event_marker, cache='body', args=('breakdown', 'page', 'per_page'))
 def event_report(event_id):
     """Generate report for a specific event"""
     event = Event.query.get_or_404(event_id)
-    records = AttendanceRecord.query.filter_by(event_id=event_id).all()
-    
-    # Get attendance data from all records
-    attendance_data = []
-    for record in records:
-        attendances = record.attendances
-        for attendance in attendances:
-            attendance_data.append({
-                'student_id': attendance.student_id,
-                'student_fname': attendance.student_fname,
-                'student_year_level': attendance.student_year_level,
-                'student_course': attendance.course,
-                'status': attendance.status,
-                'timestamp': attendance.timestamp,
-                'record_name': record.record_name
-            })
+    breakdown = parse_breakdown(request.args.get('breakdown'))
     
-    # Calculate statistics
-    total_students = len(attendance_data)
-    present_count = len([a for a in attendance_data if a['status'] == 'Present'])
-    absent_count = len([a for a in attendance_data if a['status'] == 'Absent'])
-    excused_count = len([a for a in attendance_data if a['status'] == 'Excused'])
+    # Statistics come from one GROUP BY query, only one page of detail rows is loaded
+    totals, groups = event_statistics(event_id, breakdown)
+    page, per_page = _page_args()
+    attendance_data, pagination = event_page(event_id, page, per_page, totals['total'])
     
     return render_template('reports/event_report.html', 
                          event=event, 
                          attendance_data=attendance_data,
-                         total_students=total_students,
-                         present_count=present_count,
-                         absent_count=absent_count,
-                         excused_count=excused_count)
+                         pagination=pagination,
+                         breakdown=breakdown,
+                         breakdown_rows=groups,
+                         total_students=totals['total'],
+                         present_count=totals['Present'],
+                         absent_count=totals['Absent'],
+                         excused_count=totals['Excused'])
+
+@reports_bp.route('/event/<int:event_id>/rows')
+@conditional(event_marker, cache='body', args=('page', 'per_page'))
+def event_report_rows(event_id):
+    """Return one page of event report rows as JSON (lazy-loaded detail table)"""
+    Event.query.get_or_404(event_id)
+    totals, _ = event_statistics(event_id)
+    page, per_page = _page_args()
+    rows, pagination = event_page(event_id, page, per_page, totals['total'])
+    return jsonify({'success': True, 'pagination': pagination, 'rows': _serialize_rows(rows)})
 
 @reports_bp.route('/record/<int:record_id>')
+@conditional(record_marker, cache='body', args=('breakdown', 'page', 'per_page'))
 def record_report(record_id):
     """Generate report for a specific attendance record"""
     record = AttendanceRecord.query.get_or_404(record_id)
-    attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
+    breakdown = parse_breakdown(request.args.get('breakdown'))
     
-    # Calculate statistics
-    total_students = len(attendances)
-    present_count = len([a for a in attendances if a.status == 'Present'])
-    absent_count = len([a for a in attendances if a.status == 'Absent'])
-    excused_count = len([a for a in attendances if a.status == 'Excused'])
+    # Statistics come from one GROUP BY query, only one page of detail rows is loaded
+    totals, groups = record_statistics(record_id, breakdown)
+    page, per_page = _page_args()
+    attendances, pagination = record_page(record_id, page, per_page, totals['total'])
     
     return render_template('reports/record_report.html', 
                          record=record, 
                          attendances=attendances,
-                         total_students=total_students,
-                         present_count=present_count,
-                         absent_count=absent_count,
-                         excused_count=excused_count)
+                         pagination=pagination,
+                         breakdown=breakdown,
+                         breakdown_rows=groups,
+                         total_students=totals['total'],
+                         present_count=totals['Present'],
+                         absent_count=totals['Absent'],
+                         excused_count=totals['Excused'])
+
+@reports_bp.route('/record/<int:record_id>/rows')
+@conditional(record_marker, cache='body', args=('page', 'per_page'))
+def record_report_rows(record_id):
+    """Return one page of record report rows as JSON (lazy-loaded detail table)"""
+    AttendanceRecord.query.get_or_404(record_id)
+    totals, _ = record_statistics(record_id)
+    page, per_page = _page_args()
+    rows, pagination = record_page(record_id, page, per_page, totals['total'])
+    return jsonify({'success': True, 'pagination': pagination, 'rows': _serialize_rows(rows)})
 
 @reports_bp.route('/export/event/<int:event_id>/csv')
+@conditional(event_marker, cache='file', args=('compress',))
 def export_event_csv(event_id):
-    """Export event report to CSV"""
+    """Export event report to CSV, streamed row by row (?compress=gzip for .csv.gz)"""
     event = Event.query.get_or_404(event_id)
-    records = AttendanceRecord.query.filter_by(event_id=event_id).all()
-    
-    # Get attendance data
-    attendance_data = []
-    for record in records:
-        attendances = record.attendances
-        for attendance in attendances:
-            attendance_data.append({
-                'student_id': attendance.student_id,
-                'student_fname': attendance.student_fname,
-                'student_year_level': attendance.student_year_level,
-                'student_course': attendance.student_course,
-                'status': attendance.status,
-                'timestamp': attendance.timestamp,
-                'record_name': record.record_name
-            })
     
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Event Report', event.event_name])
-    writer.writerow(['Event Date', event.event_date])
-    writer.writerow(['Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-    writer.writerow([])
-    writer.writerow(['Student ID', 'First Name', 'Year Level', 'Course', 'Status', 'Timestamp', 'Record'])
-    
-    for attendance in attendance_data:
-        writer.writerow([
-            attendance['student_id'],
-            attendance['student_fname'],
-            attendance['student_year_level'],
-            attendance['student_course'],
-            attendance['status'],
-            attendance['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if attendance['timestamp'] else '',
-            attendance['record_name']
-        ])
-    
-    output.seek(0)
-    
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'event_report_{event.event_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    preamble = [
+        ['Event Report', event.event_name],
+        ['Event Date', event.event_date],
+        ['Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+        [],
+        EVENT_HEADERS
+    ]
+    
+    return csv_response(
+        preamble,
+        iter_export_rows(event_rows_query(event_id)),
+        f'event_report_{event.event_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+        compress=request.args.get('compress') == 'gzip',
+        cache_slot=cache_slot()
     )
 
 @reports_bp.route('/export/record/<int:record_id>/csv')
+@conditional(record_marker, cache='file', args=('compress',))
 def export_record_csv(record_id):
-    """Export record report to CSV"""
+    """Export record report to CSV, streamed row by row (?compress=gzip for .csv.gz)"""
     record = AttendanceRecord.query.get_or_404(record_id)
-    attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Attendance Record Report', record.record_name])
-    writer.writerow(['Event', record.event.event_name])
-    writer.writerow(['Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')])
-    writer.writerow([])
-    writer.writerow(['Student ID', 'First Name', 'Year Level', 'Course', 'Status', 'Timestamp'])
-    
-    for attendance in attendances:
-        writer.writerow([
-            attendance.student_id,
-            attendance.student_fname,
-            attendance.student_year_level,
-            attendance.student_course,
-            attendance.status,
-            attendance.timestamp.strftime('%Y-%m-%d %H:%M:%S') if attendance.timestamp else ''
-        ])
-    
-    output.seek(0)
     
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'record_report_{record.record_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    preamble = [
+        ['Attendance Record Report', record.record_name],
+        ['Event', record.event.event_name],
+        ['Generated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+        [],
+        RECORD_HEADERS
+    ]
+    
+    return csv_response(
+        preamble,
+        iter_export_rows(record_rows_query(record_id)),
+        f'record_report_{record.record_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+        compress=request.args.get('compress') == 'gzip',
+        cache_slot=cache_slot()
     )
 
+def _event_excel(event, layout=None):
+    """(build, download name) of an event workbook; build(progress=None) returns the file path.
+
+    layout='sheets' writes a pivot summary sheet plus one sheet per record,
+    anything else the single flat sheet.
+    """
+    event_id, event_name, event_date = event.event_id, event.event_name, event.event_date
+    generated = datetime.now()
+    preamble = lambda total: [
+        f"Event Report - {event_name}",
+        f"Event Date: {event_date}",
+        f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Total Students: {total}"
+    ]
+    
+    if layout == 'sheets':
+        workers = current_app.config.get('EXPORT_SHEET_WORKERS', 4)
+        build = lambda progress=None: event_workbook_file(event_id, preamble, workers, progress)
+    else:
+        build = lambda progress=None: excel_report_file(
+            "Event Report", preamble, EVENT_HEADERS, event_rows_query(event_id), progress)
+    return build, f'event_report_{event_name}_{generated.strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+def _record_excel(record):
+    """(build, download name) of a record workbook; build(progress=None) returns the file path"""
+    record_id, record_name, event_name = record.record_id, record.record_name, record.event.event_name
+    generated = datetime.now()
+    
+    build = lambda progress=None: excel_report_file(
+        "Record Report",
+        lambda total: [
+            f"Attendance Record Report - {record_name}",
+            f"Event: {event_name}",
+            f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Total Students: {total}"
+        ],
+        RECORD_HEADERS,
+        record_rows_query(record_id),
+        progress
+    )
+    return build, f'record_report_{record_name}_{generated.strftime("%Y%m%d_%H%M%S")}.xlsx'
+
 @reports_bp.route('/export/event/<int:event_id>/excel')
+@conditional(event_marker, cache='file', args=('layout',))
 def export_event_excel(event_id):
-    """Export event report to Excel"""
-    event = Event.query.get_or_404(event_id)
-    records = AttendanceRecord.query.filter_by(event_id=event_id).all()
-    
-    # Get attendance data
-    attendance_data = []
-    for record in records:
-        attendances = record.attendances
-        for attendance in attendances:
-            attendance_data.append({
-                'student_id': attendance.student_id,
-                'student_fname': attendance.student_fname,
-                'student_year_level': attendance.student_year_level,
-                'student_course': attendance.student_course,
-                'status': attendance.status,
-                'timestamp': attendance.timestamp,
-                'record_name': record.record_name
-            })
-    
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Event Report"
-    
-    # Add headers
-    ws['A1'] = f"Event Report - {event.event_name}"
-    ws['A2'] = f"Event Date: {event.event_date}"
-    ws['A3'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    ws['A4'] = f"Total Students: {len(attendance_data)}"
-    
-    # Style headers
-    for cell in ['A1', 'A2', 'A3', 'A4']:
-        ws[cell].font = Font(bold=True, size=12)
-    
-    # Add data headers
-    headers = ['Student ID', 'First Name', 'Year Level', 'Course', 'Status', 'Timestamp', 'Record']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=6, column=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-    
-    # Add data
-    for row, attendance in enumerate(attendance_data, 7):
-        ws.cell(row=row, column=1, value=attendance['student_id'])
-        ws.cell(row=row, column=2, value=attendance['student_fname'])
-        ws.cell(row=row, column=3, value=attendance['student_year_level'])
-        ws.cell(row=row, column=4, value=attendance['student_course'])
-        ws.cell(row=row, column=5, value=attendance['status'])
-        ws.cell(row=row, column=6, value=attendance['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if attendance['timestamp'] else '')
-        ws.cell(row=row, column=7, value=attendance['record_name'])
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to memory
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'event_report_{event.event_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    """Export event report to Excel using a write-only (streaming) workbook (?layout=sheets for a sheet per record)"""
+    build, download_name = _event_excel(Event.query.get_or_404(event_id), request.args.get('layout'))
+    return excel_response(build, download_name, cache_slot())
 
 @reports_bp.route('/export/record/<int:record_id>/excel')
+@conditional(record_marker, cache='file')
 def export_record_excel(record_id):
-    """Export record report to Excel"""
-    record = AttendanceRecord.query.get_or_404(record_id)
-    attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
-    
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Record Report"
-    
-    # Add headers
-    ws['A1'] = f"Attendance Record Report - {record.record_name}"
-    ws['A2'] = f"Event: {record.event.event_name}"
-    ws['A3'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    ws['A4'] = f"Total Students: {len(attendances)}"
-    
-    # Style headers
-    for cell in ['A1', 'A2', 'A3', 'A4']:
-        ws[cell].font = Font(bold=True, size=12)
-    
-    # Add data headers
-    headers = ['Student ID', 'First Name', 'Year Level', 'Course', 'Status', 'Timestamp']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=6, column=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-    
-    # Add data
-    for row, attendance in enumerate(attendances, 7):
-        ws.cell(row=row, column=1, value=attendance.student_id)
-        ws.cell(row=row, column=2, value=attendance.student_fname)
-        ws.cell(row=row, column=3, value=attendance.student_year_level)
-        ws.cell(row=row, column=4, value=attendance.student_course)
-        ws.cell(row=row, column=5, value=attendance.status)
-        ws.cell(row=row, column=6, value=attendance.timestamp.strftime('%Y-%m-%d %H:%M:%S') if attendance.timestamp else '')
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to memory
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=f'record_report_{record.record_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    )
+    """Export record report to Excel using a write-only (streaming) workbook"""
+    build, download_name = _record_excel(AttendanceRecord.query.get_or_404(record_id))
+    return excel_response(build, download_name, cache_slot())
+
+def _job_response(job, started):
+    """Job status JSON; 202 with a Location header while the file is not ready"""
+    payload = job.to_dict()
+    payload['status_url'] = url_for('reports.export_job_status', job_id=job.job_id)
+    payload['download_url'] = url_for('reports.export_job_download', job_id=job.job_id)
+    payload['started'] = started
+    response = jsonify({'success': job.state != FAILED, 'job': payload})
+    if job.state in (QUEUED, RUNNING):
+        response.status_code = 202
+        response.headers['Location'] = payload['status_url']
+    return response
+
+@reports_bp.route('/export/event/<int:event_id>/excel/job', methods=['POST'])
+def export_event_excel_job(event_id):
+    """Start (or join) a background Excel export of an event (?layout=sheets as for the direct export)"""
+    marker = event_marker(event_id)
+    if marker is None:
+        abort(404)
+    layout = request.args.get('layout')
+    build, download_name = _event_excel(Event.query.get_or_404(event_id), layout)
+    key = export_jobs.job_key('event_excel', event_id, layout, marker)
+    return _job_response(*export_jobs.submit(key, build, download_name, XLSX_MIMETYPE))
+
+@reports_bp.route('/export/record/<int:record_id>/excel/job', methods=['POST'])
+def export_record_excel_job(record_id):
+    """Start (or join) a background Excel export of an attendance record"""
+    marker = record_marker(record_id)
+    if marker is None:
+        abort(404)
+    build, download_name = _record_excel(AttendanceRecord.query.get_or_404(record_id))
+    key = export_jobs.job_key('record_excel', record_id, tuple(marker))
+    return _job_response(*export_jobs.submit(key, build, download_name, XLSX_MIMETYPE))
+
+@reports_bp.route('/jobs/<job_id>')
+def export_job_status(job_id):
+    """Return the state and progress of an export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Export job not found or expired'}), 404
+    return _job_response(job, False)
+
+@reports_bp.route('/jobs/<job_id>/download')
+def export_job_download(job_id):
+    """Download the file of a finished export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Export job not found or expired'}), 404
+    if job.state != FINISHED:
+        return jsonify({'success': False, 'message': f'Export job is {job.state}', 'job': job.to_dict()}), 409
+    return file_response(job.path, job.download_name, job.mimetype, remove=False)
 
 @reports_bp.route('/summary')
 def summary():
     """Generate summary report"""
-    # Get overall statistics
-    total_students = Student.query.count()
-    total_events = Event.query.count()
-    total_records = AttendanceRecord.query.count()
-    
-    # Get recent attendance statistics
-    today = datetime.now().date()
-    today_attendance = Attendance.query.filter(
-        Attendance.timestamp >= today
-    ).count()
-    
-    # Get attendance by status
-    present_count = Attendance.query.filter_by(status='Present').count()
-    absent_count = Attendance.query.filter_by(status='Absent').count()
-    excused_count = Attendance.query.filter_by(status='Excused').count()
+    # Get overall and per-status statistics from the cached dashboard counters
+    counters = dashboard_counters.snapshot()
     
     # Get recent events
     recent_events = Event.query.order_by(Event.created_at.desc()).limit(10).all()
     
     return render_template('reports/summary.html',
-                         total_students=total_students,
-                         total_events=total_events,
-                         total_records=total_records,
-                         today_attendance=today_attendance,
-                         present_count=present_count,
-                         absent_count=absent_count,
-                         excused_count=excused_count,
+                         total_students=counters['total_students'],
+                         total_events=counters['total_events'],
+                         total_records=counters['total_records'],
+                         today_attendance=counters['today_attendance'],
+                         present_count=counters['present_count'],
+                         absent_count=counters['absent_count'],
+                         excused_count=counters['excused_count'],
                          recent_events=recent_events)
+
+@reports_bp.route('/cache-stats')
+def cache_stats():
+    """Return report cache hit/miss counters and tier sizes, and export job counters"""
+    return jsonify({'success': True, 'report_cache': report_cache.stats(), 'export_jobs': export_jobs.stats()})
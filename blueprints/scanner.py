@@ -1,5 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from models import Student, AttendanceRecord, Attendance, db
+from services.student_cache import student_cache
+from services.student_search import student_search
+from services.scan_ingest import scan_ingestor
+from services.attendance_store import upsert_attendance, attendance_row, toggle_present, bulk_set_status
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import cv2
 import numpy as np
@@ -31,33 +36,39 @@ def process_qr():
     if not qr_data or not record_id:
         return jsonify({'success': False, 'message': 'Missing QR data or record ID'})
     
-    # Find student by student ID
-    student = Student.query.filter_by(student_id=qr_data).first()
+    try:
+        record_id = int(record_id)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid record ID'})
+    
+    # Find student by student ID (served from the roster cache when warm)
+    student = student_cache.get(qr_data)
     
     if not student:
         return jsonify({'success': False, 'message': 'Student not found'})
     
-    # Find or create attendance record
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=qr_data).first()
-    
-    if not attendance:
-        # Create new attendance record
-        attendance = Attendance(
-            record_id=record_id,
-            student_id=student.student_id,
-            student_fname=student.fname,
-            student_year_level=student.year_level,
-            student_course=student.course,
-            status='Present',
-            timestamp=datetime.now()
-        )
-        db.session.add(attendance)
-    else:
-        # Update existing attendance
-        attendance.status = 'Present'
-        attendance.timestamp = datetime.now()
+    # Write-behind mode: acknowledge once the scan is spooled, the flusher commits it
+    if scan_ingestor.write_behind:
+        # Never acknowledge a scan the flusher could not write later (the
+        # synchronous upsert below fails on its own for a missing record)
+        if db.session.get(AttendanceRecord, record_id) is None:
+            return jsonify({'success': False, 'message': 'Attendance record not found'})
+        scan_ingestor.submit(record_id, student)
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'message': f'Attendance recorded for {student.fname}',
+            'student': {
+                'id': student.student_id,
+                'name': student.fname,
+                'year_level': student.year_level,
+                'course': student.course
+            }
+        })
     
     try:
+        # Insert or update the attendance row in one atomic upsert
+        upsert_attendance([attendance_row(record_id, student, 'Present', datetime.now())])
         db.session.commit()
         return jsonify({
             'success': True, 
@@ -69,6 +80,10 @@ def process_qr():
                 'course': student.course
             }
         })
+    except IntegrityError:
+        # A missing record leaves the row without a version (NOT NULL)
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Attendance record not found'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error recording attendance: {str(e)}'})
@@ -90,7 +105,7 @@ def manual_entry(record_id):
             return redirect(url_for('scanner.manual_entry', record_id=record_id))
         
         # Find student
-        student = Student.query.filter_by(student_id=student_id).first()
+        student = student_cache.get(student_id)
         
         if not student:
             if 'application/json' in (request.headers.get('Accept') or ''):
@@ -98,27 +113,9 @@ def manual_entry(record_id):
             flash('Student not found', 'error')
             return redirect(url_for('scanner.manual_entry', record_id=record_id))
         
-        # Find or create attendance record
-        attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first()
-        
-        if not attendance:
-            # Create new attendance record
-            attendance = Attendance(
-                record_id=record_id,
-                student_id=student.student_id,
-                student_fname=student.fname,
-                student_year_level=student.year_level,
-                student_course=student.course,
-                status=status,
-                timestamp=datetime.now()
-            )
-            db.session.add(attendance)
-        else:
-            # Update existing attendance
-            attendance.status = status
-            attendance.timestamp = datetime.now()
-        
         try:
+            # Insert or update the attendance row in one atomic upsert
+            upsert_attendance([attendance_row(record_id, student, status, datetime.now())])
             db.session.commit()
             if 'application/json' in (request.headers.get('Accept') or ''):
                 return jsonify({
@@ -130,7 +127,7 @@ def manual_entry(record_id):
                         'year_level': student.year_level,
                         'course': student.course
                     },
-                    'status': attendance.status
+                    'status': status
                 })
             flash(f'Attendance recorded for {student.fname}', 'success')
         except Exception as e:
@@ -141,9 +138,27 @@ def manual_entry(record_id):
         
         return redirect(url_for('scanner.manual_entry', record_id=record_id))
     
-    # Get students for dropdown
-    students = Student.query.order_by(Student.student_id).all()
-    return render_template('scanner/manual_entry.html', record=record, students=students)
+    # No roster on the page, the student field looks students up through scanner.lookup
+    return render_template('scanner/manual_entry.html', record=record,
+                           lookup_url=url_for('scanner.lookup'))
+
+@scanner_bp.route('/lookup')
+def lookup():
+    """Typeahead for manual entry: top ?limit= students whose id or name starts with ?q="""
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    students = student_search.complete(query, limit)
+    return jsonify({
+        'success': True,
+        'students': [
+            {
+                'student_id': s.student_id,
+                'fname': s.fname,
+                'year_level': s.year_level,
+                'course': s.course
+            } for s in students
+        ]
+    })
 
 @scanner_bp.route('/quick-mark/<int:record_id>')
 def quick_mark(record_id):
@@ -151,30 +166,29 @@ def quick_mark(record_id):
     record = AttendanceRecord.query.get_or_404(record_id)
     attendances = Attendance.query.filter_by(record_id=record_id).order_by(Attendance.student_id).all()
     
-    return render_template('scanner/quick_mark.html', record=record, attendances=attendances)
+    return render_template('scanner/quick_mark.html', record=record, attendances=attendances,
+                           live_url=url_for('attendance.live_record', record_id=record_id))
 
 @scanner_bp.route('/quick-mark/<int:record_id>/toggle/<student_id>', methods=['POST'])
 def toggle_attendance(record_id, student_id):
     """Toggle attendance status for quick marking"""
-    attendance = Attendance.query.filter_by(record_id=record_id, student_id=student_id).first_or_404()
-    
     try:
-        if attendance.status == 'Present':
-            attendance.status = 'Absent'
-            attendance.timestamp = None
-        else:
-            attendance.status = 'Present'
-            attendance.timestamp = datetime.now()
-        
+        # The database flips the status itself, so concurrent toggles cannot race
+        toggled = toggle_present(record_id, student_id, datetime.now())
         db.session.commit()
-        return jsonify({
-            'success': True, 
-            'status': attendance.status,
-            'timestamp': attendance.timestamp.isoformat() if attendance.timestamp else None
-        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error updating attendance: {str(e)}'})
+    
+    if toggled is None:
+        abort(404)
+    
+    status, timestamp = toggled
+    return jsonify({
+        'success': True, 
+        'status': status,
+        'timestamp': timestamp.isoformat() if timestamp else None
+    })
 
 @scanner_bp.route('/bulk-mark/<int:record_id>', methods=['POST'])
 def bulk_mark(record_id):
@@ -186,21 +200,26 @@ def bulk_mark(record_id):
         flash('Invalid action', 'error')
         return redirect(url_for('scanner.quick_mark', record_id=record_id))
     
-    attendances = Attendance.query.filter_by(record_id=record_id).all()
-    
     try:
-        for attendance in attendances:
-            if action == 'mark_all_present':
-                attendance.status = 'Present'
-                attendance.timestamp = datetime.now()
-            else:
-                attendance.status = 'Absent'
-                attendance.timestamp = None
+        if action == 'mark_all_present':
+            updated = bulk_set_status(record_id, 'Present', datetime.now())
+        else:
+            updated = bulk_set_status(record_id, 'Absent', None)
         
         db.session.commit()
-        flash(f'All students marked as {action.split("_")[-1]}', 'success')
+        flash(f'All students marked as {action.split("_")[-1]} ({updated} updated)', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Error during bulk marking: {str(e)}', 'error')
     
     return redirect(url_for('scanner.quick_mark', record_id=record_id))
+
+@scanner_bp.route('/cache-stats')
+def cache_stats():
+    """Return student cache/search index counters and scan ingestion queue state"""
+    return jsonify({
+        'success': True,
+        'student_cache': student_cache.stats(),
+        'student_search': student_search.stats(),
+        'scan_ingest': scan_ingestor.stats()
+    })
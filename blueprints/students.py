@@ -1,5 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
 from models import Student, db
+from services.student_search import student_search
+from services.attendance_store import mark_rows_removed
+from services.conditional import conditional, students_marker
+from services.compact_json import wants_compact, compact_payload, json_response
 from werkzeug.utils import secure_filename
 import csv
 import io
@@ -10,6 +14,7 @@ from datetime import datetime
 students_bp = Blueprint('students', __name__)
 
 @students_bp.route('/')
+@conditional(students_marker)
 def index():
     """Display all students"""
     students = Student.query.order_by(Student.student_id).all()
@@ -88,6 +93,8 @@ def delete(student_id):
     student = Student.query.filter_by(student_id=student_id).first_or_404()
     
     try:
+        # The student's attendance rows go with them, so watchers of those records must resync
+        mark_rows_removed(student_id)
         db.session.delete(student)
         db.session.commit()
         flash('Student deleted successfully', 'success')
@@ -149,6 +156,7 @@ def import_csv():
     return render_template('students/import.html')
 
 @students_bp.route('/export')
+@conditional(students_marker)
 def export_csv():
     """Export students to CSV file"""
     students = Student.query.order_by(Student.student_id).all()
@@ -197,22 +205,28 @@ def generate_qr_codes():
     flash(f'{generated_count} QR codes generated successfully', 'success')
     return redirect(url_for('students.index'))
 
+# Student fields returned by the JSON search, in compact column order
+SEARCH_FIELDS = ('student_id', 'fname', 'year_level', 'course')
+
 @students_bp.route('/search')
+@conditional(students_marker, args=('q', 'format'))
 def search():
-    """Search students"""
+    """Search students, exact and prefix matches first"""
     query = request.args.get('q', '')
+    wants_json = 'application/json' in (request.headers.get('Accept') or '')
     if query:
-        students = Student.query.filter(
-            (Student.student_id.contains(query)) |
-            (Student.fname.contains(query)) |
-            (Student.year_level.contains(query)) |
-            (Student.course.contains(query))
-        ).order_by(Student.student_id).all()
+        students = student_search.search(query)
+    elif wants_json:
+        # Plain column rows: compact_payload transposes sequences, not ORM objects
+        students = db.session.query(*(getattr(Student, field) for field in SEARCH_FIELDS))\
+            .order_by(Student.student_id).all()
     else:
         students = Student.query.order_by(Student.student_id).all()
     # If client expects JSON (web version fetch), return JSON list
-    if 'application/json' in (request.headers.get('Accept') or ''):
-        return jsonify({
+    if wants_json:
+        if wants_compact():
+            return json_response(compact_payload(students, SEARCH_FIELDS, categorical=('year_level', 'course')))
+        return json_response({
             'success': True,
             'students': [
                 {
@@ -1,100 +1,345 @@
 """
 Camera and QR code scanning functionality for the Attendance Management System
+
+Frames go through three stages so that neither reading the camera nor
+decoding QR codes blocks the Qt main thread:
+
+* a capture thread reads the camera as fast as it delivers frames;
+* a decode worker (QThread) decodes the newest frame, at most
+  CAMERA_DECODE_FPS times a second (0 = as fast as it can), and sends the
+  codes it found back to the UI with a signal;
+* a UI timer shows the newest frame every CAMERA_UPDATE_INTERVAL ms, with
+  the outlines of the last decoded codes drawn on it.
+
+Stages hand frames over through LatestSlot buffers that keep only the
+newest frame, so a slow stage skips frames instead of falling behind. Each
+stage has its own rate meter (see CameraScanner.stats).
 """
 
+import time
+import threading
+from collections import deque, OrderedDict
 import cv2
 import numpy as np
 from pyzbar.pyzbar import decode
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtCore import Qt
-from config import CAMERA_UPDATE_INTERVAL, CAMERA_DISPLAY_WIDTH, CAMERA_DISPLAY_HEIGHT
+from config import (CAMERA_UPDATE_INTERVAL, CAMERA_DISPLAY_WIDTH, CAMERA_DISPLAY_HEIGHT,
+                    CAMERA_DECODE_FPS, CAMERA_SHOW_STATS, SCAN_COOLDOWN_SECONDS, SCAN_COOLDOWN_MAX_ENTRIES)
+
+# How long the outline of a decoded code stays on screen without a new decode
+OUTLINE_HOLD_SECONDS = 0.5
+
+# Outline colours (BGR): newly marked, and badges still within their cooldown
+OUTLINE_COLOR = (0, 255, 0)
+DUPLICATE_COLOR = (0, 165, 255)
+
+STATUS_IDLE = "Point camera at QR code"
+
+
+class LatestSlot:
+    """Single-slot buffer between two threads: put() replaces a frame not taken yet"""
+
+    def __init__(self):
+        self._item = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._condition.notify()
+
+    def take(self, timeout=None):
+        """Remove and return the newest item, waiting up to timeout; None if there is none"""
+        with self._condition:
+            if self._item is None and not self._closed and timeout != 0:
+                self._condition.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        """Wake up a waiting take()"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def reopen(self):
+        with self._condition:
+            self._item = None
+            self._closed = False
+            self.dropped = 0
+
+
+class RateMeter:
+    """Events per second over a sliding window"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._times = deque()
+
+    def tick(self):
+        now = time.monotonic()
+        self._times.append(now)
+        while self._times[0] < now - self.window:
+            self._times.popleft()
+
+    def rate(self):
+        times = list(self._times)
+        if len(times) < 2 or times[-1] < time.monotonic() - self.window:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def reset(self):
+        self._times.clear()
+
+
+class ScanCooldown:
+    """Recently committed scans, so a badge held in front of the camera is written once per window.
+
+    Keys are (event_id, student_id). At most max_entries keys are kept; the
+    oldest are forgotten first, which can only let a scan through early.
+    """
+
+    def __init__(self, seconds=SCAN_COOLDOWN_SECONDS, max_entries=SCAN_COOLDOWN_MAX_ENTRIES):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self.duplicates = 0
+
+    def remaining(self, key):
+        """Seconds left in key's cooldown, or 0 if a scan should be committed"""
+        seen = self._seen.get(key)
+        if seen is None:
+            return 0
+        left = seen + self.seconds - time.monotonic()
+        if left <= 0:
+            del self._seen[key]
+            return 0
+        self.duplicates += 1
+        return left
+
+    def remember(self, key):
+        """Start key's cooldown after a committed scan"""
+        self._seen.pop(key, None)
+        self._seen[key] = time.monotonic()
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def clear(self):
+        self._seen.clear()
+
+
+def code_outline(obj):
+    """Outline of a decoded code as integer points (convex hull when pyzbar gives more than 4)"""
+    points = obj.polygon
+    if len(points) > 4:
+        hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
+        points = np.squeeze(hull)
+    return [(int(x), int(y)) for x, y in points]
+
+
+class QRDecodeWorker(QThread):
+    """Decodes the newest captured frame; emits [(data, outline), ...] per decoded frame"""
+
+    decoded = pyqtSignal(list)
+
+    def __init__(self, frames, max_fps=0):
+        super().__init__()
+        self.frames = frames
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0
+        self.rate = RateMeter()
+        self._running = False
+
+    def start(self):
+        self._running = True
+        super().start()
+
+    def stop(self):
+        self._running = False
+        self.frames.close()
+        self.wait()
+
+    def run(self):
+        last = 0
+        while self._running:
+            if self.min_interval:
+                # Wait first, then take whatever frame is newest by then
+                delay = last + self.min_interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            frame = self.frames.take(timeout=0.1)
+            if frame is None:
+                continue
+            last = time.monotonic()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            results = [(obj.data.decode('utf-8'), code_outline(obj)) for obj in decode(gray)]
+            self.rate.tick()
+            self.decoded.emit(results)
 
 
 class CameraScanner:
     """Handles camera operations and QR code scanning"""
-    
+
     def __init__(self, camera_label, status_label, parent):
         self.camera_label = camera_label
         self.status_label = status_label
         self.parent = parent
         self.cap = None
+        self.decode_frames = LatestSlot()
+        self.display_frames = LatestSlot()
+        self.capture_rate = RateMeter()
+        self.display_rate = RateMeter()
+        self.capture_thread = None
+        self.capturing = False
+        self.outlines = []
+        self.outlines_time = 0
+        self.cooldown = ScanCooldown()
+        self.status_reset = QTimer()
+        self.status_reset.setSingleShot(True)
+        self.status_reset.timeout.connect(lambda: self.show_status(STATUS_IDLE))
+        self.decoder = QRDecodeWorker(self.decode_frames, CAMERA_DECODE_FPS)
+        self.decoder.decoded.connect(self.handle_decoded)
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
-    
+
     def start_camera(self):
         """Start the camera and begin scanning"""
         self.cap = cv2.VideoCapture(0)
         if self.cap.isOpened():
+            self.decode_frames.reopen()
+            self.display_frames.reopen()
+            for meter in (self.capture_rate, self.display_rate, self.decoder.rate):
+                meter.reset()
+            self.capturing = True
+            self.capture_thread = threading.Thread(target=self.capture_loop, name='camera-capture', daemon=True)
+            self.capture_thread.start()
+            self.decoder.start()
             self.timer.start(CAMERA_UPDATE_INTERVAL)
         else:
             self.status_label.setText("Error: Could not open camera")
-    
+
     def stop_camera(self):
-        """Stop the camera and timer"""
+        """Stop the timer, the capture thread and the decoder, then release the camera"""
         self.timer.stop()
+        self.capturing = False
+        if self.capture_thread:
+            self.capture_thread.join()
+            self.capture_thread = None
+        if self.decoder.isRunning():
+            self.decoder.stop()
         if self.cap:
             self.cap.release()
             self.cap = None
-    
-    def update_frame(self):
-        """Update camera frame and scan for QR codes"""
-        if self.cap and self.cap.isOpened():
+        self.outlines = []
+
+    def capture_loop(self):
+        """Read frames on the capture thread and hand them to the decoder and the display"""
+        while self.capturing:
             ret, frame = self.cap.read()
-            if ret:
-                # Convert frame to RGB for QR detection
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Decode QR codes
-                decoded_objects = decode(rgb_frame)
-                
-                for obj in decoded_objects:
-                    # Draw rectangle around QR code
-                    points = obj.polygon
-                    if len(points) > 4:
-                        hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
-                        hull = list(map(tuple, np.squeeze(hull)))
-                    else:
-                        hull = points
-                    
-                    n = len(hull)
-                    for j in range(0, n):
-                        cv2.line(frame, hull[j], hull[(j+1) % n], (0, 255, 0), 3)
-                    
-                    # Process QR code data
-                    data = obj.data.decode('utf-8')
-                    self.process_qr_code(data)
-                
-                # Convert frame to QImage and display
-                self.display_frame(frame)
-    
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self.capture_rate.tick()
+            self.decode_frames.put(frame)
+            self.display_frames.put(frame)
+
+    def handle_decoded(self, results):
+        """Decoder results, delivered on the UI thread"""
+        self.outlines = []
+        for data, outline in results:
+            duplicate = self.process_qr_code(data) is False
+            self.outlines.append((outline, DUPLICATE_COLOR if duplicate else OUTLINE_COLOR))
+        self.outlines_time = time.monotonic()
+
+    def update_frame(self):
+        """Show the newest captured frame with the last decoded outlines"""
+        frame = self.display_frames.take(timeout=0)
+        if frame is None:
+            return
+        outlines = self.outlines if time.monotonic() - self.outlines_time < OUTLINE_HOLD_SECONDS else []
+        if outlines or CAMERA_SHOW_STATS:
+            # The decoder may still be reading this frame; draw on a copy
+            frame = frame.copy()
+            for hull, color in outlines:
+                n = len(hull)
+                for j in range(0, n):
+                    cv2.line(frame, hull[j], hull[(j+1) % n], color, 3)
+            if CAMERA_SHOW_STATS:
+                stats = self.stats()
+                text = (f"capture {stats['capture_fps']:.0f} / decode {stats['decode_fps']:.0f} / "
+                        f"display {stats['display_fps']:.0f} fps")
+                cv2.putText(frame, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        self.display_rate.tick()
+        self.display_frame(frame)
+
     def display_frame(self, frame):
         """Convert OpenCV frame to QImage and display it"""
         h, w, ch = frame.shape
         bytes_per_line = ch * w
         qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(qt_image).scaled(
-            CAMERA_DISPLAY_WIDTH, CAMERA_DISPLAY_HEIGHT, 
+            CAMERA_DISPLAY_WIDTH, CAMERA_DISPLAY_HEIGHT,
             Qt.KeepAspectRatio, Qt.SmoothTransformation
         )
         self.camera_label.setPixmap(pixmap)
-    
+
+    def stats(self):
+        """Frames per second of each stage, frames skipped by the decoder and the display, duplicate scans"""
+        return {
+            'duplicate_scans': self.cooldown.duplicates,
+            'capture_fps': self.capture_rate.rate(),
+            'decode_fps': self.decoder.rate.rate(),
+            'display_fps': self.display_rate.rate(),
+            'decode_dropped': self.decode_frames.dropped,
+            'display_dropped': self.display_frames.dropped
+        }
+
     def process_qr_code(self, data):
-        """Process scanned QR code data"""
+        """Process scanned QR code data.
+
+        Returns True when the scan was written, False for a duplicate within
+        the cooldown window and None on errors.
+        """
         try:
             student_id = data.strip()
-            
-            self.parent.db.mark_student_present(self.parent.current_event_id, student_id)
-            
-            self.parent.populate_attendance_table(self.parent.current_event_id)
-            
-            self.status_label.setText(f"Scanned: {student_id} marked as Present")
-            
-            QTimer.singleShot(2000, lambda: self.status_label.setText("Point camera at QR code"))
-            
+            event_id = self.parent.current_event_id
+            key = (event_id, student_id)
+
+            remaining = self.cooldown.remaining(key)
+            if remaining:
+                self.show_status(f"Duplicate: {student_id} already marked "
+                                 f"(again in {remaining:.0f}s)", DUPLICATE_COLOR)
+                return False
+
+            if not self.parent.db.mark_student_present(event_id, student_id):
+                self.show_status(f"Error: could not mark {student_id}")
+                return None
+            self.cooldown.remember(key)
+
+            # Patch only this student's rows instead of reloading the whole roster;
+            # a table showing another event is left alone (None)
+            if self.parent.update_attendance_row(event_id, student_id, 'Present') != 0:
+                self.show_status(f"Scanned: {student_id} marked as Present")
+            else:
+                self.show_status(f"Scanned: {student_id} is not on this attendance list", DUPLICATE_COLOR)
+            return True
+
         except Exception as e:
-            self.status_label.setText(f"Error: {str(e)}")
-    
+            self.show_status(f"Error: {str(e)}")
+            return None
+
+    def show_status(self, text, color=None):
+        """Show a scanner message; anything but the idle prompt reverts to it after 2 seconds"""
+        self.status_label.setText(text)
+        self.status_label.setStyleSheet(f"color: rgb({color[2]}, {color[1]}, {color[0]});" if color else "")
+        if text != STATUS_IDLE:
+            self.status_reset.start(2000)
+
     def is_camera_active(self):
         """Check if camera is currently active"""
         return self.cap is not None and self.cap.isOpened()
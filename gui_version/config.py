@@ -21,10 +21,19 @@ APP_WIDTH = int(os.getenv('APP_WIDTH', 900))
 APP_HEIGHT = int(os.getenv('APP_HEIGHT', 700))
 
 # Camera settings
-CAMERA_UPDATE_INTERVAL = int(os.getenv('CAMERA_UPDATE_INTERVAL', 30))  # milliseconds
+CAMERA_UPDATE_INTERVAL = int(os.getenv('CAMERA_UPDATE_INTERVAL', 30))  # milliseconds, display refresh
+CAMERA_DECODE_FPS = int(os.getenv('CAMERA_DECODE_FPS', 0))  # QR decodes per second, 0 = as fast as possible
+CAMERA_SHOW_STATS = os.getenv('CAMERA_SHOW_STATS', 'false').lower() == 'true'  # capture/decode/display fps overlay
 CAMERA_DISPLAY_WIDTH = int(os.getenv('CAMERA_DISPLAY_WIDTH', 640))
 CAMERA_DISPLAY_HEIGHT = int(os.getenv('CAMERA_DISPLAY_HEIGHT', 480))
 
+# A badge is written once per cooldown window; later sightings only show "Duplicate"
+SCAN_COOLDOWN_SECONDS = float(os.getenv('SCAN_COOLDOWN_SECONDS', 10))
+SCAN_COOLDOWN_MAX_ENTRIES = int(os.getenv('SCAN_COOLDOWN_MAX_ENTRIES', 2048))
+
+# Search boxes filter this long after the last keystroke
+SEARCH_DEBOUNCE_MS = int(os.getenv('SEARCH_DEBOUNCE_MS', 250))  # milliseconds
+
 # UI styling
 BUTTON_STYLE = """
     QPushButton {
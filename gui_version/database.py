@@ -7,6 +7,16 @@ import csv
 from datetime import datetime
 from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, SAMPLE_STUDENTS
 
+# Secondary indexes for the hot queries: (table, index name, columns)
+INDEXES = [
+    ('Attendance', 'idx_attendance_record_status', ('record_id', 'status', 'student_id')),
+    ('Attendance', 'idx_attendance_status', ('status',)),
+    ('Attendance', 'idx_attendance_timestamp', ('timestamp',)),
+    ('AttendanceRecords', 'idx_records_event_created', ('event_id', 'created_at')),
+    ('AttendanceRecords', 'idx_records_created', ('created_at',)),
+    ('Events', 'idx_events_created', ('created_at',)),
+]
+
 
 class DatabaseManager:
     """Handles all database operations for the attendance system"""
@@ -76,11 +86,43 @@ class DatabaseManager:
                 
                 self.conn.commit()
                 print("Database tables created/verified successfully")
+            
+            self.ensure_indexes()
                 
         except pymysql.Error as err:
             print(f"Error creating tables: {err}")
             raise
     
+    def get_indexes(self, table):
+        """Return {index name: [columns]} for a table"""
+        with self.conn.cursor() as cursor:
+            cursor.execute('''SELECT INDEX_NAME, COLUMN_NAME
+                              FROM information_schema.STATISTICS
+                              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                              ORDER BY INDEX_NAME, SEQ_IN_INDEX''', (table,))
+            indexes = {}
+            for row in cursor.fetchall():
+                indexes.setdefault(row['INDEX_NAME'], []).append(row['COLUMN_NAME'])
+            return indexes
+    
+    def ensure_indexes(self):
+        """Create any missing secondary indexes and verify their columns"""
+        created = []
+        with self.conn.cursor() as cursor:
+            for table, name, columns in INDEXES:
+                if name not in self.get_indexes(table):
+                    cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+                    created.append(name)
+        self.conn.commit()
+        
+        for table, name, columns in INDEXES:
+            if self.get_indexes(table).get(name) != list(columns):
+                raise pymysql.Error(f"Index {table}.{name} does not match columns {columns}")
+        if created:
+            print(f"Created indexes: {', '.join(created)}")
+        print("Database indexes verified successfully")
+        return created
+    
     def import_students_from_csv(self, filename):
         """Import students from a CSV file"""
         try:
@@ -141,13 +183,14 @@ class DatabaseManager:
                 cursor.execute("INSERT INTO AttendanceRecords (record_name, event_id) VALUES (%s, %s)", (record_name, event_id))
                 record_id = cursor.lastrowid
                 
-                # Initialize all students as absent for this record
-                students = self.get_all_students()
-                for student in students:
-                    cursor.execute(
-                        "INSERT INTO Attendance (record_id, student_id, student_fname, student_year_level, student_course, status) VALUES (%s, %s, %s, %s, %s, %s)",
-                        (record_id, student['student_id'], student['fname'], student['year_level'], student['course'], 'Absent')
-                    )
+                # Initialize all students as absent for this record in one statement
+                cursor.execute(
+                    """INSERT INTO Attendance (record_id, student_id, student_fname, student_year_level, student_course, status)
+                       SELECT %s, s.student_id, s.fname, s.year_level, s.course, 'Absent'
+                       FROM Students s
+                       WHERE NOT EXISTS (SELECT 1 FROM Attendance a WHERE a.record_id = %s AND a.student_id = s.student_id)""",
+                    (record_id, record_id)
+                )
                 
                 self.conn.commit()
                 return record_id
@@ -5,7 +5,7 @@ Main application for the Attendance Management System
 import sys
 import os
 import qrcode
-from PyQt5.QtWidgets import QApplication, QMainWindow, QStackedWidget, QMessageBox, QComboBox, QTableWidgetItem, QFileDialog
+from PyQt5.QtWidgets import QApplication, QMainWindow, QStackedWidget, QMessageBox, QTableWidgetItem, QFileDialog
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 import openpyxl
@@ -98,52 +98,30 @@ class MainWindow(QMainWindow):
     
     def populate_masterlist_table(self):
         """Populate the masterlist table with student data"""
-        students = self.db.get_all_students()
-        self.masterlist_page.masterlist_table.setRowCount(len(students))
-        
-        for row, student in enumerate(students):
-            student_id = str(student['student_id'])
-            fname = str(student['fname'])
-            year_level = str(student['year_level'])
-            course = str(student['course'])
-            
-            self.masterlist_page.masterlist_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.masterlist_page.masterlist_table.setItem(row, 1, QTableWidgetItem(fname))
-            self.masterlist_page.masterlist_table.setItem(row, 2, QTableWidgetItem(year_level))
-            self.masterlist_page.masterlist_table.setItem(row, 3, QTableWidgetItem(course))
-        
+        self.masterlist_page.masterlist_model.load(self.db.get_all_students())
         self.filter_masterlist_table()
     
     def populate_attendance_table(self, event_id):
         """Populate the attendance table for a specific event"""
         attendance = self.db.get_attendance_for_event(event_id)
-        self.attendance_page.attendance_table.setRowCount(len(attendance))
-        
-        for row, record in enumerate(attendance):
-            student_id = str(record['student_id'])
-            student_fname = str(record['student_fname'])
-            student_year_level = str(record['student_year_level'])
-            student_course = str(record['student_course'])
-            status = str(record['status'])
-            timestamp = str(record['timestamp']) if record['timestamp'] else ''
-            
-            self.attendance_page.attendance_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.attendance_page.attendance_table.setItem(row, 1, QTableWidgetItem(student_fname))
-            self.attendance_page.attendance_table.setItem(row, 2, QTableWidgetItem(student_year_level))
-            self.attendance_page.attendance_table.setItem(row, 3, QTableWidgetItem(student_course))
-            self.attendance_page.attendance_table.setItem(row, 4, QTableWidgetItem(timestamp))
-            
-            status_combo = QComboBox()
-            status_combo.addItems(ATTENDANCE_STATUSES)
-            status_combo.setCurrentText(status)
-            status_combo.currentTextChanged.connect(
-                lambda status, row=row, event_id=event_id, student_id=student_id: 
-                self.db.update_attendance_status(event_id, student_id, status)
-            )
-            self.attendance_page.attendance_table.setCellWidget(row, 5, status_combo)
-        
+        self.attendance_page.attendance_model.load(
+            attendance,
+            lambda student_id, status: self.db.update_attendance_status(event_id, student_id, status),
+            event_id
+        )
         self.filter_attendance_table()
     
+    def update_attendance_row(self, event_id, student_id, status, timestamp=None):
+        """Patch one student's loaded attendance rows after a scan for event_id.
+
+        Returns the number of rows changed, or None when the table shows
+        another event's rows, which the scan did not touch.
+        """
+        model = self.attendance_page.attendance_model
+        if model.event_id != event_id:
+            return None
+        return model.update_student(student_id, status, timestamp)
+    
     def populate_records_table(self, event_id):
         """Populate the records table for a specific event"""
         records = self.db.get_records_for_event(event_id)
@@ -159,31 +137,11 @@ class MainWindow(QMainWindow):
     def populate_students_table(self, record_id):
         """Populate the students table for a specific record"""
         students = self.db.get_students_for_record(record_id)
-        self.attendance_page.attendance_table.setRowCount(len(students))
-        
-        for row, student in enumerate(students):
-            student_id = str(student['student_id'])
-            student_fname = str(student['student_fname'])
-            student_year_level = str(student['student_year_level'])
-            student_course = str(student['student_course'])
-            status = str(student['status'])
-            timestamp = str(student['timestamp']) if student['timestamp'] else ''
-            
-            self.attendance_page.attendance_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.attendance_page.attendance_table.setItem(row, 1, QTableWidgetItem(student_fname))
-            self.attendance_page.attendance_table.setItem(row, 2, QTableWidgetItem(student_year_level))
-            self.attendance_page.attendance_table.setItem(row, 3, QTableWidgetItem(student_course))
-            self.attendance_page.attendance_table.setItem(row, 4, QTableWidgetItem(timestamp))
-            
-            status_combo = QComboBox()
-            status_combo.addItems(ATTENDANCE_STATUSES)
-            status_combo.setCurrentText(status)
-            status_combo.currentTextChanged.connect(
-                lambda status, row=row, record_id=record_id, student_id=student_id: 
-                self.update_attendance_status_for_record(record_id, student_id, status)
-            )
-            self.attendance_page.attendance_table.setCellWidget(row, 5, status_combo)
-        
+        self.attendance_page.attendance_model.load(
+            students,
+            lambda student_id, status: self.update_attendance_status_for_record(record_id, student_id, status),
+            self.current_event_id
+        )
         self.filter_attendance_table()
     
     def update_attendance_status_for_record(self, record_id, student_id, status):
@@ -201,97 +159,15 @@ class MainWindow(QMainWindow):
             return False
     
     def filter_attendance_table(self):
-        """Filter the attendance table based on search text and status filter"""
-        search_text = self.attendance_page.search_input.text().lower()
-        status_filter = self.attendance_page.status_filter.currentText()
-        
-        if hasattr(self, 'current_record_id') and self.current_record_id:
-            all_students = self.db.get_students_for_record(self.current_record_id)
-            is_record_context = True
-        elif hasattr(self, 'current_event_id') and self.current_event_id:
-            all_students = self.db.get_attendance_for_event(self.current_event_id)
-            is_record_context = False
-        else:
-            return
-
-        filtered_students = []
-        for student in all_students:
-            matches_search = (
-                search_text in str(student['student_id']).lower() or
-                search_text in str(student['student_fname']).lower() or
-                search_text in str(student['student_year_level']).lower() or
-                search_text in str(student['student_course']).lower()
-            )
-            
-            matches_status = (status_filter == "All Statuses" or 
-                            student['status'] == status_filter)
-            
-            if matches_search and matches_status:
-                filtered_students.append(student)
-        
-        self.attendance_page.attendance_table.setRowCount(len(filtered_students))
-        
-        for row, student in enumerate(filtered_students):
-            student_id = str(student['student_id'])
-            student_fname = str(student['student_fname'])
-            student_year_level = str(student['student_year_level'])
-            student_course = str(student['student_course'])
-            status = str(student['status'])
-            timestamp = str(student['timestamp']) if student['timestamp'] else ''
-            
-            self.attendance_page.attendance_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.attendance_page.attendance_table.setItem(row, 1, QTableWidgetItem(student_fname))
-            self.attendance_page.attendance_table.setItem(row, 2, QTableWidgetItem(student_year_level))
-            self.attendance_page.attendance_table.setItem(row, 3, QTableWidgetItem(student_course))
-            self.attendance_page.attendance_table.setItem(row, 4, QTableWidgetItem(timestamp))
-            
-            status_combo = QComboBox()
-            status_combo.addItems(ATTENDANCE_STATUSES)
-            status_combo.setCurrentText(status)
-            
-            if is_record_context:
-                status_combo.currentTextChanged.connect(
-                    lambda status, row=row, record_id=self.current_record_id, student_id=student_id: 
-                    self.update_attendance_status_for_record(record_id, student_id, status)
-                )
-            else:
-                status_combo.currentTextChanged.connect(
-                    lambda status, row=row, event_id=self.current_event_id, student_id=student_id: 
-                    self.db.update_attendance_status(event_id, student_id, status)
-                )
-            
-            self.attendance_page.attendance_table.setCellWidget(row, 5, status_combo)
+        """Filter the loaded attendance rows based on search text and status filter"""
+        self.attendance_page.attendance_proxy.set_filter(
+            self.attendance_page.search_input.text(),
+            self.attendance_page.status_filter.currentText()
+        )
     
     def filter_masterlist_table(self):
-        """Filter the masterlist table based on search text"""
-        search_text = self.masterlist_page.masterlist_search_input.text().lower()
-        
-        all_students = self.db.get_all_students()
-        
-        filtered_students = []
-        for student in all_students:
-            matches_search = (
-                search_text in str(student['student_id']).lower() or
-                search_text in str(student['fname']).lower() or
-                search_text in str(student['year_level']).lower() or
-                search_text in str(student['course']).lower()
-            )
-            
-            if matches_search:
-                filtered_students.append(student)
-        
-        self.masterlist_page.masterlist_table.setRowCount(len(filtered_students))
-        
-        for row, student in enumerate(filtered_students):
-            student_id = str(student['student_id'])
-            fname = str(student['fname'])
-            year_level = str(student['year_level'])
-            course = str(student['course'])
-            
-            self.masterlist_page.masterlist_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.masterlist_page.masterlist_table.setItem(row, 1, QTableWidgetItem(fname))
-            self.masterlist_page.masterlist_table.setItem(row, 2, QTableWidgetItem(year_level))
-            self.masterlist_page.masterlist_table.setItem(row, 3, QTableWidgetItem(course))
+        """Filter the loaded masterlist based on search text"""
+        self.masterlist_page.masterlist_proxy.set_search(self.masterlist_page.masterlist_search_input.text())
     
     def export_attendance_to_excel(self):
         """Export the current attendance table to an Excel file"""
@@ -0,0 +1,269 @@
+"""
+Table models for the Attendance Management System
+
+The attendance and masterlist tables are QTableViews over these models
+instead of QTableWidgets with an item per cell (and a QComboBox per row).
+Rows are kept column by column (statuses as a byte array of
+ATTENDANCE_STATUSES indexes), Qt only asks for the cells that are on screen,
+and the Status column is edited through StatusDelegate.
+
+The last loaded rows stay in the model together with a lowercase search key
+per row, so the filter proxies answer search and status changes in memory;
+the database is only queried again when the data is reloaded.
+"""
+
+from array import array
+from datetime import datetime
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtWidgets import QStyledItemDelegate, QComboBox
+from config import ATTENDANCE_STATUSES
+
+ATTENDANCE_COLUMNS = ["Student ID", "First Name", "Year Level", "Course", "Timestamp", "Status"]
+MASTERLIST_COLUMNS = ["Student ID", "First Name", "Year Level", "Course"]
+TIMESTAMP_COLUMN = 4
+STATUS_COLUMN = 5
+
+# Status <-> code used by the byte array; -1 marks a status outside the list
+STATUS_CODES = {status: code for code, status in enumerate(ATTENDANCE_STATUSES)}
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Joins the searchable fields of a row; it cannot be typed, so a match never spans two fields
+SEARCH_KEY_SEPARATOR = '\x00'
+
+
+def search_key(*fields):
+    """Lowercase key searched by the filter proxies"""
+    return SEARCH_KEY_SEPARATOR.join(fields).lower()
+
+
+def format_timestamp(timestamp):
+    """Timestamp as shown in the table ('' when not set)"""
+    if not timestamp:
+        return ''
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime(TIMESTAMP_FORMAT)
+    return str(timestamp)
+
+
+class StudentRows:
+    """Column-oriented store for student rows as returned by DatabaseManager"""
+
+    # Row keys of the student fields; attendance rows use the student_* snapshot columns
+    FIELDS = ('student_id', 'fname', 'year_level', 'course')
+
+    def __init__(self, rows=()):
+        self.student_ids = []
+        self.names = []
+        self.year_levels = []
+        self.courses = []
+        self.search_keys = []
+        # Year levels and courses repeat across thousands of rows; keep one string each
+        shared = {}
+        id_field, name_field, year_field, course_field = self.FIELDS
+        for row in rows:
+            student_id, name = str(row[id_field]), str(row[name_field])
+            year_level, course = str(row[year_field]), str(row[course_field])
+            self.student_ids.append(student_id)
+            self.names.append(name)
+            self.year_levels.append(shared.setdefault(year_level, year_level))
+            self.courses.append(shared.setdefault(course, course))
+            self.search_keys.append(search_key(student_id, name, year_level, course))
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def value(self, row, column):
+        """Display value of one cell, in MASTERLIST_COLUMNS order"""
+        if column == 0:
+            return self.student_ids[row]
+        if column == 1:
+            return self.names[row]
+        if column == 2:
+            return self.year_levels[row]
+        return self.courses[row]
+
+
+class AttendanceRows(StudentRows):
+    """Column-oriented store for attendance rows as returned by DatabaseManager"""
+
+    FIELDS = ('student_id', 'student_fname', 'student_year_level', 'student_course')
+
+    def __init__(self, rows=()):
+        rows = list(rows)
+        super().__init__(rows)
+        self.statuses = array('b', (STATUS_CODES.get(row['status'], -1) for row in rows))
+        self.timestamps = [format_timestamp(row['timestamp']) for row in rows]
+        # student_id -> row, or a tuple of rows when an event view lists the student once per record
+        self.row_index = {}
+        for row, student_id in enumerate(self.student_ids):
+            found = self.row_index.setdefault(student_id, row)
+            if found != row:
+                self.row_index[student_id] = (found if isinstance(found, tuple) else (found,)) + (row,)
+
+    def rows_for(self, student_id):
+        """Rows holding student_id (empty if the student is not loaded)"""
+        found = self.row_index.get(student_id, ())
+        return found if isinstance(found, tuple) else (found,)
+
+    def status(self, row):
+        code = self.statuses[row]
+        return ATTENDANCE_STATUSES[code] if code >= 0 else ''
+
+    def value(self, row, column):
+        """Display value of one cell, in ATTENDANCE_COLUMNS order"""
+        if column == TIMESTAMP_COLUMN:
+            return self.timestamps[row]
+        if column == STATUS_COLUMN:
+            return self.status(row)
+        return super().value(row, column)
+
+    def set_status(self, row, status, timestamp):
+        self.statuses[row] = STATUS_CODES.get(status, -1)
+        self.timestamps[row] = timestamp
+
+
+class StudentTableModel(QAbstractTableModel):
+    """Read-only masterlist rows"""
+
+    columns = MASTERLIST_COLUMNS
+    rows_class = StudentRows
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = self.rows_class()
+
+    def load(self, rows):
+        """Replace the rows with a freshly loaded dataset"""
+        self.beginResetModel()
+        self.rows = self.rows_class(rows)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        return self.rows.value(index.row(), index.column())
+
+
+class AttendanceTableModel(StudentTableModel):
+    """Attendance rows of a record or event; only the Status column is editable"""
+
+    columns = ATTENDANCE_COLUMNS
+    rows_class = AttendanceRows
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.status_writer = None
+        self.event_id = None
+
+    def load(self, rows, status_writer=None, event_id=None):
+        """Replace the rows; status_writer(student_id, status) saves an edit and returns True on success.
+
+        event_id is the event the rows belong to, so patches for another
+        event's scans can be told apart (see MainWindow.update_attendance_row).
+        """
+        self.status_writer = status_writer
+        self.event_id = event_id
+        super().load(rows)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == STATUS_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """Save a status edit through the status writer, then update the row"""
+        if role != Qt.EditRole or not index.isValid() or index.column() != STATUS_COLUMN:
+            return False
+        row = index.row()
+        if value not in STATUS_CODES or value == self.rows.status(row):
+            return False
+        student_id = self.rows.student_ids[row]
+        if self.status_writer and not self.status_writer(student_id, value):
+            return False
+        # The writer updates every row of the student shown (all records of an event)
+        self.update_student(student_id, value)
+        return True
+
+    def update_student(self, student_id, status, timestamp=None):
+        """Patch the status and timestamp of student_id's rows; returns how many rows changed"""
+        timestamp = format_timestamp(timestamp or datetime.now())
+        rows = self.rows.rows_for(student_id)
+        for row in rows:
+            self.rows.set_status(row, status, timestamp)
+            self.dataChanged.emit(self.index(row, TIMESTAMP_COLUMN), self.index(row, STATUS_COLUMN))
+        return len(rows)
+
+
+class SearchFilterProxy(QSortFilterProxyModel):
+    """Filters model rows whose search key contains the search text"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.search_text = ''
+
+    def set_search(self, search_text):
+        search_text = search_text.lower()
+        if search_text != self.search_text:
+            self.search_text = search_text
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return not self.search_text or self.search_text in self.sourceModel().rows.search_keys[source_row]
+
+
+class AttendanceFilterProxy(SearchFilterProxy):
+    """Filters AttendanceTableModel rows by search text and status"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.status_code = None
+
+    def set_filter(self, search_text, status):
+        """Apply a search text and a status ('All Statuses' or any unknown value shows every status)"""
+        search_text = search_text.lower()
+        status_code = STATUS_CODES.get(status)
+        if (search_text, status_code) != (self.search_text, self.status_code):
+            self.search_text, self.status_code = search_text, status_code
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.status_code is not None and self.sourceModel().rows.statuses[source_row] != self.status_code:
+            return False
+        return super().filterAcceptsRow(source_row, source_parent)
+
+
+class StatusDelegate(QStyledItemDelegate):
+    """Edits the Status column with a combo box created only while editing"""
+
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(ATTENDANCE_STATUSES)
+        # Save as soon as a status is picked rather than when focus leaves the cell
+        editor.activated.connect(lambda: self.commit_and_close(editor))
+        return editor
+
+    def commit_and_close(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
@@ -4,10 +4,21 @@ UI page components for the Attendance Management System
 
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                              QLabel, QTableWidget, QTableWidgetItem, QComboBox, 
-                             QLineEdit, QHeaderView, QAbstractItemView)
-from PyQt5.QtCore import Qt
+                             QLineEdit, QHeaderView, QAbstractItemView, QTableView)
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
-from config import BUTTON_STYLE, ATTENDANCE_STATUSES
+from config import BUTTON_STYLE, ATTENDANCE_STATUSES, SEARCH_DEBOUNCE_MS
+from table_models import (StudentTableModel, SearchFilterProxy, AttendanceTableModel, AttendanceFilterProxy,
+                          StatusDelegate, STATUS_COLUMN)
+
+
+def debounce_timer(parent, callback):
+    """Single-shot timer that calls `callback` SEARCH_DEBOUNCE_MS after its last start()"""
+    timer = QTimer(parent)
+    timer.setSingleShot(True)
+    timer.setInterval(SEARCH_DEBOUNCE_MS)
+    timer.timeout.connect(callback)
+    return timer
 
 
 class MainPage(QWidget):
@@ -181,7 +192,9 @@ class MasterlistPage(QWidget):
         search_layout = QHBoxLayout()
         self.masterlist_search_input = QLineEdit()
         self.masterlist_search_input.setPlaceholderText("Search by ID, Name, Year Level, or Course...")
-        self.masterlist_search_input.textChanged.connect(self.parent.filter_masterlist_table)
+        # Filter once typing pauses, not on every keystroke
+        self.masterlist_search_timer = debounce_timer(self, self.parent.filter_masterlist_table)
+        self.masterlist_search_input.textChanged.connect(self.masterlist_search_timer.start)
         
         search_layout.addWidget(QLabel("Search:"))
         search_layout.addWidget(self.masterlist_search_input)
@@ -196,11 +209,14 @@ class MasterlistPage(QWidget):
         qr_btn_layout.addWidget(generate_qr_btn)
         qr_btn_layout.addStretch()
         
-        # Masterlist table
-        self.masterlist_table = QTableWidget()
-        self.masterlist_table.setColumnCount(4)
-        self.masterlist_table.setHorizontalHeaderLabels(["Student ID", "First Name", "Year Level", "Course"])
+        # Masterlist table (model/view: rows live in the model, the proxy filters them)
+        self.masterlist_model = StudentTableModel(self)
+        self.masterlist_proxy = SearchFilterProxy(self)
+        self.masterlist_proxy.setSourceModel(self.masterlist_model)
+        self.masterlist_table = QTableView()
+        self.masterlist_table.setModel(self.masterlist_proxy)
         self.masterlist_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.masterlist_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.masterlist_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         
         # Layout
@@ -251,7 +267,9 @@ class AttendancePage(QWidget):
         # Search bar
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search by ID, Name, Year Level, or Course...")
-        self.search_input.textChanged.connect(self.parent.filter_attendance_table)
+        # Filter once typing pauses, not on every keystroke
+        self.search_timer = debounce_timer(self, self.parent.filter_attendance_table)
+        self.search_input.textChanged.connect(self.search_timer.start)
         
         # Status filter dropdown
         self.status_filter = QComboBox()
@@ -265,11 +283,17 @@ class AttendancePage(QWidget):
         search_filter_layout.addWidget(self.status_filter)
         search_filter_layout.addStretch()
         
-        # Attendance table
-        self.attendance_table = QTableWidget()
-        self.attendance_table.setColumnCount(6)
-        self.attendance_table.setHorizontalHeaderLabels(["Student ID", "First Name", "Year Level", "Course", "Timestamp", "Status"])
+        # Attendance table (model/view: rows live in the model, the proxy filters them)
+        self.attendance_model = AttendanceTableModel(self)
+        self.attendance_proxy = AttendanceFilterProxy(self)
+        self.attendance_proxy.setSourceModel(self.attendance_model)
+        self.attendance_table = QTableView()
+        self.attendance_table.setModel(self.attendance_proxy)
+        self.attendance_table.setItemDelegateForColumn(STATUS_COLUMN, StatusDelegate(self.attendance_table))
+        self.attendance_table.setEditTriggers(QAbstractItemView.AllEditTriggers)
         self.attendance_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Fixed row heights keep Qt from measuring every row
+        self.attendance_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         
         # Layout
         layout.addWidget(back_btn)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Schema migration tool for the COMSOC Attendance web database
+
+Adds the columns and indexes declared in models.py that are missing from an
+existing MySQL or SQLite database (db.create_all only builds them for new
+tables), verifies the indexes, and prints EXPLAIN output for the app's hot
+queries before and after the migration.
+
+Usage:
+    python migrate_database.py             # migrate, verify and show query plans
+    python migrate_database.py --check     # only report what is missing (exit 1 if anything is)
+    python migrate_database.py --explain   # only print the query plans
+"""
+
+import sys
+import os
+from datetime import datetime, date
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+
+def hot_queries():
+    """The statements behind the app's busiest pages, with sample parameters"""
+    from sqlalchemy import select, func
+    from models import Event, AttendanceRecord, Attendance
+    from services.exports import record_rows_query, event_rows_query
+
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    return [
+        ('record roster (view_record, exports)', record_rows_query(1)),
+        ('status filter (filter_attendance)',
+         select(Attendance.student_id, Attendance.status)
+         .where(Attendance.record_id == 1, Attendance.status == 'Present')
+         .order_by(Attendance.student_id)),
+        ('record statistics (record_report)',
+         select(Attendance.status, func.count()).where(Attendance.record_id == 1).group_by(Attendance.status)),
+        ('dashboard status counts',
+         select(Attendance.status, func.count()).group_by(Attendance.status)),
+        ("today's scans",
+         select(func.count()).select_from(Attendance).where(Attendance.timestamp >= today_start)),
+        ('event report rows', event_rows_query(1)),
+        ('records of an event (events.records)',
+         select(AttendanceRecord.record_id)
+         .where(AttendanceRecord.event_id == 1)
+         .order_by(AttendanceRecord.created_at.desc())),
+        ('recent events', select(Event.event_id).order_by(Event.created_at.desc()).limit(10)),
+        ('delta sync (attendance.record_changes)',
+         select(Attendance.student_id, Attendance.status)
+         .where(Attendance.record_id == 1, Attendance.row_version > 5)
+         .order_by(Attendance.row_version, Attendance.student_id)),
+    ]
+
+
+def explain(connection, statement):
+    """Return the database's query plan for a statement as a list of text rows"""
+    dialect = connection.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    result = connection.exec_driver_sql(prefix + sql)
+    columns = list(result.keys())
+    return [', '.join(f'{column}={value}' for column, value in zip(columns, row) if value is not None)
+            for row in result]
+
+
+def print_plans(connection, title):
+    print(f"\n=== Query plans {title} ===")
+    for label, statement in hot_queries():
+        print(f"\n-- {label}")
+        try:
+            lines = explain(connection, statement)
+        except Exception as e:
+            # e.g. the query uses a column this migration has not added yet
+            connection.rollback()
+            lines = [f"(no plan: {e.__class__.__name__})"]
+        for line in lines:
+            print(f"   {line}")
+
+
+def missing_columns(connection):
+    """Columns declared on the models that the database tables do not have yet"""
+    from sqlalchemy import inspect
+    from models import db
+    inspector = inspect(connection)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(column for column in table.columns if column.name not in present)
+    return missing
+
+
+def add_column(connection, column):
+    """ALTER TABLE ... ADD COLUMN using the model's own column DDL"""
+    from sqlalchemy.schema import CreateColumn
+    ddl = CreateColumn(column).compile(dialect=connection.dialect)
+    table = connection.dialect.identifier_preparer.format_table(column.table)
+    connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+
+
+def existing_indexes(connection, table_name):
+    """Index name -> column list for a table as the database reports it"""
+    from sqlalchemy import inspect
+    inspector = inspect(connection)
+    indexes = {index['name']: list(index['column_names']) for index in inspector.get_indexes(table_name)}
+    for constraint in inspector.get_unique_constraints(table_name):
+        indexes.setdefault(constraint['name'], list(constraint['column_names']))
+    return indexes
+
+
+def missing_indexes(connection):
+    """Indexes declared on the models that the database does not have yet"""
+    from models import db
+    missing = []
+    for table in db.metadata.sorted_tables:
+        present = existing_indexes(connection, table.name)
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name not in present:
+                missing.append(index)
+    return missing
+
+
+def verify_indexes(connection):
+    """Check every declared index exists with the declared columns"""
+    from models import db
+    problems = []
+    for table in db.metadata.sorted_tables:
+        present = existing_indexes(connection, table.name)
+        for index in table.indexes:
+            expected = [column.name for column in index.columns]
+            if present.get(index.name) != expected:
+                problems.append(f"{table.name}.{index.name}: expected {expected}, found {present.get(index.name)}")
+    return problems
+
+
+def main():
+    args = set(sys.argv[1:])
+    from app import app
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+        print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+
+        with engine.connect() as connection:
+            if '--explain' in args:
+                print_plans(connection, '(current schema)')
+                return 0
+
+            new_columns = missing_columns(connection)
+            if not new_columns:
+                print("✓ All declared columns already exist")
+            for column in new_columns:
+                print(f"- missing column {column.table.name}.{column.name} ({column.type})")
+
+            missing = missing_indexes(connection)
+            if not missing:
+                print("✓ All declared indexes already exist")
+            for index in missing:
+                columns = ', '.join(column.name for column in index.columns)
+                print(f"- missing {index.table.name}.{index.name} ({columns})")
+            if '--check' in args:
+                return 1 if new_columns or missing else 0
+
+            print_plans(connection, 'BEFORE migration')
+
+        with engine.begin() as connection:
+            # Columns first, the new indexes may cover them
+            for column in new_columns:
+                print(f"Adding column {column.table.name}.{column.name}...")
+                add_column(connection, column)
+            for index in missing:
+                print(f"Creating {index.table.name}.{index.name}...")
+                index.create(bind=connection)
+
+        with engine.connect() as connection:
+            problems = verify_indexes(connection)
+            if problems:
+                for problem in problems:
+                    print(f"❌ {problem}")
+                return 1
+            print("\n✓ Indexes verified")
+            print_plans(connection, 'AFTER migration')
+
+    print("\n🎉 Migration completed successfully!")
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except ImportError as e:
+        print(f"Import Error: {e}")
+        print("Please install required dependencies:")
+        print("pip install -r requirements.txt")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Migration Error: {e}")
+        print("\nTroubleshooting tips:")
+        print("1. Make sure MySQL server is running")
+        print("2. Check your .env file configuration")
+        print("3. Ensure the MySQL user may CREATE INDEX on the database")
+        sys.exit(1)
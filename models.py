@@ -11,9 +11,15 @@ class Student(db.Model):
     year_level = db.Column(db.String(20), nullable=False)
     course = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship
     attendances = db.relationship('Attendance', backref='student', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # MAX(updated_at) for the students list ETag
+        db.Index('idx_students_updated', 'updated_at'),
+    )
 
 class Event(db.Model):
     __tablename__ = 'events'
@@ -25,6 +31,11 @@ class Event(db.Model):
     
     # Relationships
     attendance_records = db.relationship('AttendanceRecord', backref='event', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Event lists are ordered newest first
+        db.Index('idx_events_created', 'created_at'),
+    )
 
 class AttendanceRecord(db.Model):
     __tablename__ = 'attendance_records'
@@ -33,9 +44,19 @@ class AttendanceRecord(db.Model):
     record_name = db.Column(db.String(100), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('events.event_id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped by every attendance write on the record, rows keep the version that last wrote them
+    change_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    # Version at which rows were last removed; clients synced before it must refetch
+    resync_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     
     # Relationships
     attendances = db.relationship('Attendance', backref='attendance_record', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Records of an event ordered by creation, and the global newest-first lists
+        db.Index('idx_records_event_created', 'event_id', 'created_at'),
+        db.Index('idx_records_created', 'created_at'),
+    )
 
 class Attendance(db.Model):
     __tablename__ = 'attendance'
@@ -48,7 +69,17 @@ class Attendance(db.Model):
     student_course = db.Column(db.String(50), nullable=False)
     status = db.Column(db.Enum('Present', 'Absent', 'Excused'), default='Absent')
     timestamp = db.Column(db.DateTime, nullable=True)
+    row_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     
     __table_args__ = (
+        # Also serves lookups and student_id ordering within a record
         db.UniqueConstraint('record_id', 'student_id', name='unique_attendance'),
+        # Status filters and per-record status counts, ordered by student_id (covering)
+        db.Index('idx_attendance_record_status', 'record_id', 'status', 'student_id'),
+        # Global status counts for the dashboard
+        db.Index('idx_attendance_status', 'status'),
+        # "Today" range counts
+        db.Index('idx_attendance_timestamp', 'timestamp'),
+        # Delta sync: rows of a record changed since a version
+        db.Index('idx_attendance_record_version', 'record_id', 'row_version', 'student_id'),
     )
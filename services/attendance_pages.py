@@ -0,0 +1,159 @@
+"""
+Keyset pagination over the attendance rows of a record
+
+Pages are ordered by student_id and continue from a cursor (the last
+student_id of the previous page), so every page is an index range read on
+unique_attendance(record_id, student_id) no matter how deep the client goes.
+
+Delta sync pages the same way over (row_version, student_id) on
+idx_attendance_record_version.
+
+Page totals come from the covering-index GROUP BY, which reads every row of
+the record, so they are kept per record keyed by its (change_version,
+resync_version): while the record is unchanged a page only reads the
+versions (one primary key lookup).
+"""
+
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from flask import current_app, request
+from sqlalchemy import select, tuple_, or_, func
+from models import db, AttendanceRecord, Attendance
+from services.report_stats import record_statistics
+from services.attendance_store import IN_CHUNK_SIZE
+
+# Hard cap on ?limit= so one request cannot pull a whole record back
+MAX_PAGE_SIZE = 1000
+
+# Records whose per-status totals are kept by total_count
+TOTALS_CACHE_RECORDS = 256
+
+# record_id -> (versions, totals), least recently used first
+_totals = OrderedDict()
+_totals_lock = threading.Lock()
+
+
+def page_size_arg():
+    """Page size from ?limit=, defaulting to ATTENDANCE_PAGE_SIZE"""
+    default = current_app.config.get('ATTENDANCE_PAGE_SIZE', 200)
+    return min(max(request.args.get('limit', default, type=int), 1), MAX_PAGE_SIZE)
+
+
+def attendance_page(record_id, cursor=None, limit=200, status=None, condition=None, student_ids=None,
+                    columns=None):
+    """One page of Attendance rows after `cursor`.
+
+    columns, when given, selects just those Attendance columns and returns
+    lightweight rows instead of ORM objects (used by the JSON endpoints).
+
+    student_ids, when given, is a sorted list (e.g. from the student search
+    index) that restricts the page to those students; it is walked in IN
+    chunks from the cursor until the page is full.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    entities = [getattr(Attendance, column) for column in columns] if columns else [Attendance]
+    query = select(*entities).where(Attendance.record_id == record_id)
+    if status:
+        query = query.where(Attendance.status == status)
+    if condition is not None:
+        query = query.where(condition)
+    if student_ids is not None:
+        return _id_list_page(query, student_ids, cursor, limit, columns)
+    if cursor:
+        query = query.where(Attendance.student_id > cursor)
+    # Fetch one extra row to learn whether another page exists
+    rows = _fetch(query.order_by(Attendance.student_id).limit(limit + 1), columns)
+    return _split_page(rows, limit)
+
+
+def snapshot_match(query_text):
+    """Condition matching query_text as a substring of the row's own student columns.
+
+    Pages of a record search take their candidates from
+    student_search.matching_ids(..., include_snapshots=True) and check the
+    rows with this, so a search matches what the rows show.
+    """
+    needle = (query_text or '').strip().lower()
+    return or_(*(func.lower(column).contains(needle, autoescape=True) for column in (
+        Attendance.student_id, Attendance.student_fname, Attendance.student_year_level, Attendance.student_course
+    )))
+
+
+def _fetch(query, columns):
+    return db.session.execute(query).all() if columns else db.session.scalars(query).all()
+
+
+def _id_list_page(query, student_ids, cursor, limit, columns=None):
+    start = bisect_right(student_ids, cursor) if cursor else 0
+    rows = []
+    while start < len(student_ids) and len(rows) <= limit:
+        chunk = student_ids[start:start + IN_CHUNK_SIZE]
+        start += len(chunk)
+        rows.extend(_fetch(
+            query.where(Attendance.student_id.in_(chunk))
+            .order_by(Attendance.student_id)
+            .limit(limit + 1 - len(rows)),
+            columns
+        ))
+    return _split_page(rows, limit)
+
+
+def _split_page(rows, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].student_id
+    return rows, None
+
+
+def total_count(record_id, status=None, cursor=None, versions=None):
+    """Row count for the record (or one status), or None.
+
+    Served from the totals kept for the record's current versions (pass
+    versions when already read). When they are out of date only a first page
+    (no cursor) runs the GROUP BY again; later pages get None.
+    """
+    versions = tuple(versions or record_versions(record_id) or ())
+    with _totals_lock:
+        cached = _totals.get(record_id)
+        if cached is not None and cached[0] == versions:
+            _totals.move_to_end(record_id)
+            totals = cached[1]
+        else:
+            totals = None
+    if totals is None:
+        if cursor:
+            return None
+        totals, _ = record_statistics(record_id)
+        with _totals_lock:
+            _totals[record_id] = (versions, totals)
+            _totals.move_to_end(record_id)
+            while len(_totals) > TOTALS_CACHE_RECORDS:
+                _totals.popitem(last=False)
+    return totals.get(status, 0) if status else totals['total']
+
+
+def record_versions(record_id):
+    """(change_version, resync_version) of a record, or None if it does not exist"""
+    return db.session.execute(
+        select(AttendanceRecord.change_version, AttendanceRecord.resync_version)
+        .where(AttendanceRecord.record_id == record_id)
+    ).first()
+
+
+def changes_page(record_id, since=0, after='', limit=200):
+    """Rows of a record written after version `since`, oldest version first.
+
+    `after` continues a page inside version `since` (the last student_id
+    returned). Returns (rows, more) where more tells whether rows remain.
+    """
+    query = select(Attendance).where(Attendance.record_id == record_id)
+    if after:
+        query = query.where(tuple_(Attendance.row_version, Attendance.student_id) > tuple_(since, after))
+    elif since:
+        query = query.where(Attendance.row_version > since)
+    rows = db.session.scalars(
+        query.order_by(Attendance.row_version, Attendance.student_id).limit(limit + 1)
+    ).all()
+    return rows[:limit], len(rows) > limit
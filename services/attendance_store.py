@@ -0,0 +1,350 @@
+"""
+Set-based write helpers for the attendance table
+
+Every writer first bumps the record's change_version and stamps the rows it
+touches with the new value, which is what /attendance/record/<id>/changes
+serves deltas from. The bump takes the record row's lock until commit, so
+versions on one record become visible in order and a poller that has seen
+version N can never later find an uncommitted N-1. The price is that writes
+to one record are serialized: each waits for the previous one to commit.
+
+The same lock keeps the record's rows from changing under the writer, so
+the status writers can read the rows they are about to change after the bump
+and hand the exact changes to the dashboard counters. The scan path
+(upsert_attendance) does not pay for that read: it marks the counters dirty
+instead, and toggle_present derives the new row from the old one.
+"""
+
+import time
+from collections import namedtuple
+from sqlalchemy import insert, select, exists, literal, update, case, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Student, AttendanceRecord, Attendance
+from services.dashboard_counters import dashboard_counters, today_start
+from services.live_updates import live_updates
+
+# Rows per multi-row INSERT, keeps well under SQLite's bound-parameter limit
+UPSERT_CHUNK_SIZE = 500
+
+# Attendance columns written by an upsert, in statement order
+UPSERT_COLUMNS = ('record_id', 'student_id', 'student_fname', 'student_year_level',
+                  'student_course', 'status', 'timestamp', 'row_version')
+
+# Student ids per IN (...) list in set_statuses
+IN_CHUNK_SIZE = 1000
+
+ATTENDANCE_STATUSES = ('Present', 'Absent', 'Excused')
+
+# Sentinel for set_status: leave the timestamp column as it is
+KEEP_TIMESTAMP = object()
+
+# New (status, timestamp) of a row flipped by toggle_present
+Toggled = namedtuple('Toggled', ['status', 'timestamp'])
+
+
+def attendance_row(record_id, student, status, timestamp):
+    """Build an upsert row from a Student or CachedStudent"""
+    return {
+        'record_id': int(record_id),
+        'student_id': student.student_id,
+        'student_fname': student.fname,
+        'student_year_level': student.year_level,
+        'student_course': student.course,
+        'status': status,
+        'timestamp': timestamp
+    }
+
+
+def next_change_version(record_id):
+    """Bump the record's change_version and return the new value.
+
+    One statement: UPDATE ... RETURNING where the dialect has it (SQLite,
+    PostgreSQL), LAST_INSERT_ID(expr) on MySQL, which hands the new value
+    back with the UPDATE's result; other dialects read it back with a SELECT.
+
+    The bump holds the record row's lock until the caller commits. That is
+    what orders versions, but it also serializes writers: a scan on a record
+    waits for the previous write to the same record to commit, so callers
+    should commit right after their statements. Returns None when the record
+    does not exist. The caller commits.
+    """
+    dialect = db.session.get_bind().dialect
+    bump = update(AttendanceRecord).where(AttendanceRecord.record_id == record_id)
+    bumped = AttendanceRecord.change_version + 1
+    if dialect.update_returning:
+        return db.session.execute(
+            bump.values(change_version=bumped).returning(AttendanceRecord.change_version)
+        ).scalar()
+    if dialect.name == 'mysql':
+        # Not evaluable in Python, and a fetch would cost the SELECT this saves
+        result = db.session.execute(
+            bump.values(change_version=func.last_insert_id(bumped)),
+            execution_options={'synchronize_session': False}
+        )
+        return result.lastrowid if result.rowcount else None
+    db.session.execute(bump.values(change_version=bumped))
+    return db.session.execute(
+        select(AttendanceRecord.change_version).where(AttendanceRecord.record_id == record_id)
+    ).scalar()
+
+
+def _current_rows(record_id, student_ids):
+    """(status, timestamp) of the students' rows on a record, keyed by student id.
+
+    Call after next_change_version, which holds the rows until the caller
+    commits. Students without a row are left out.
+    """
+    found = {}
+    for offset in range(0, len(student_ids), IN_CHUNK_SIZE):
+        found.update((row.student_id, (row.status, row.timestamp)) for row in db.session.execute(
+            select(Attendance.student_id, Attendance.status, Attendance.timestamp)
+            .where(Attendance.record_id == record_id,
+                   Attendance.student_id.in_(student_ids[offset:offset + IN_CHUNK_SIZE]))
+        ))
+    return found
+
+
+def mark_rows_removed(student_id):
+    """Force a resync on every record that lists student_id (call before deleting the student).
+
+    Removed rows leave nothing behind to stamp, so the records' resync_version
+    moves to their next change_version instead. The caller commits.
+    """
+    listed = select(Attendance.record_id).where(Attendance.student_id == student_id)
+    # resync_version is assigned first: MySQL evaluates SET left to right
+    db.session.execute(
+        update(AttendanceRecord)
+        .where(AttendanceRecord.record_id.in_(listed))
+        .ordered_values(
+            (AttendanceRecord.resync_version, AttendanceRecord.change_version + 1),
+            (AttendanceRecord.change_version, AttendanceRecord.change_version + 1)
+        )
+    )
+
+
+def initialize_roster(record_id):
+    """Insert an 'Absent' row for every student not yet on the record.
+
+    Runs a single INSERT ... SELECT with an anti-join against the existing
+    rows, so the cost is one round trip regardless of the roster size.
+    Returns a tuple of (rows inserted, elapsed seconds). The caller commits.
+    """
+    start = time.perf_counter()
+    version = next_change_version(record_id)
+
+    already_listed = exists().where(
+        Attendance.record_id == record_id,
+        Attendance.student_id == Student.student_id
+    )
+    missing_students = select(
+        literal(record_id),
+        Student.student_id,
+        Student.fname,
+        Student.year_level,
+        Student.course,
+        literal('Absent'),
+        literal(version)
+    ).where(~already_listed)
+
+    result = db.session.execute(
+        insert(Attendance).from_select(
+            ['record_id', 'student_id', 'student_fname', 'student_year_level', 'student_course', 'status',
+             'row_version'],
+            missing_students
+        )
+    )
+
+    if result.rowcount:
+        dashboard_counters.record(db.session, total_attendance=result.rowcount, absent_count=result.rowcount)
+    return result.rowcount, time.perf_counter() - start
+
+
+def upsert_attendance(rows):
+    """Insert or update attendance rows keyed on (record_id, student_id).
+
+    Each row is a dict with the UPSERT_COLUMNS keys. Uses
+    INSERT ... ON DUPLICATE KEY UPDATE on MySQL and INSERT ... ON CONFLICT on
+    SQLite, chunked into multi-row statements; other dialects fall back to an
+    UPDATE followed by an INSERT for rows that did not exist. When the same
+    student appears twice only the last row is written. The caller commits.
+    Returns the number of rows sent to the database.
+    """
+    latest = {}
+    for row in rows:
+        latest[(row['record_id'], row['student_id'])] = {column: row.get(column) for column in UPSERT_COLUMNS}
+    rows = list(latest.values())
+    if not rows:
+        return 0
+
+    # One version per record, bumped in record order so concurrent batches lock alike
+    versions = {record_id: next_change_version(record_id) for record_id in sorted({row['record_id'] for row in rows})}
+    for row in rows:
+        row['row_version'] = versions[row['record_id']]
+
+    dialect = db.session.get_bind().dialect.name
+    for offset in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[offset:offset + UPSERT_CHUNK_SIZE]
+        if dialect == 'mysql':
+            stmt = mysql_insert(Attendance).values(chunk)
+            stmt = stmt.on_duplicate_key_update(status=stmt.inserted.status, timestamp=stmt.inserted.timestamp,
+                                                row_version=stmt.inserted.row_version)
+            db.session.execute(stmt)
+        elif dialect == 'sqlite':
+            stmt = sqlite_insert(Attendance).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['record_id', 'student_id'],
+                set_={'status': stmt.excluded.status, 'timestamp': stmt.excluded.timestamp,
+                      'row_version': stmt.excluded.row_version}
+            )
+            db.session.execute(stmt)
+        else:
+            for row in chunk:
+                result = db.session.execute(
+                    update(Attendance)
+                    .where(Attendance.record_id == row['record_id'], Attendance.student_id == row['student_id'])
+                    .values(status=row['status'], timestamp=row['timestamp'], row_version=row['row_version'])
+                )
+                if result.rowcount == 0:
+                    db.session.execute(insert(Attendance).values(row))
+
+    # Whether each row was inserted or updated (and from which status) would
+    # cost a read per scan; the counters recount instead
+    dashboard_counters.mark_dirty(db.session)
+    for row in rows:
+        live_updates.publish(db.session, row['record_id'], row['student_id'], row['status'], row['timestamp'])
+    return len(rows)
+
+
+def set_status(record_id, student_id, status, timestamp=KEEP_TIMESTAMP):
+    """Set one student's status with a single conditional UPDATE.
+
+    Returns False when the student has no row on the record. The caller commits.
+    """
+    values = {'status': status, 'row_version': next_change_version(record_id)}
+    if timestamp is not KEEP_TIMESTAMP:
+        values['timestamp'] = timestamp
+    old = _current_rows(record_id, [student_id]).get(student_id)
+    if old is None:
+        return False
+    result = db.session.execute(
+        update(Attendance)
+        .where(Attendance.record_id == record_id, Attendance.student_id == student_id)
+        .values(**values)
+    )
+    if result.rowcount:
+        dashboard_counters.record_change(db.session, old, (status, values.get('timestamp', old[1])))
+        live_updates.publish(db.session, record_id, student_id, status, values.get('timestamp'),
+                             keep_timestamp=timestamp is KEEP_TIMESTAMP)
+    return result.rowcount > 0
+
+
+def toggle_present(record_id, student_id, timestamp):
+    """Flip a student between Present and Absent atomically.
+
+    The flip is decided by the database inside one UPDATE, so two stations
+    toggling the same badge cannot both read the old status. Returns the new
+    (status, timestamp), or None when the student has no row on the record.
+    The caller commits.
+    """
+    version = next_change_version(record_id)
+    old = _current_rows(record_id, [student_id]).get(student_id)
+    if old is None:
+        return None
+    was_present = Attendance.status == 'Present'
+    # timestamp is assigned first: MySQL evaluates SET left to right and
+    # would otherwise see the already-flipped status
+    result = db.session.execute(
+        update(Attendance)
+        .where(Attendance.record_id == record_id, Attendance.student_id == student_id)
+        .ordered_values(
+            (Attendance.timestamp, case((was_present, None), else_=timestamp)),
+            (Attendance.status, case((was_present, 'Absent'), else_='Present')),
+            (Attendance.row_version, version)
+        )
+    )
+    if result.rowcount == 0:
+        return None
+    # The record lock kept the row as read, so the new values follow from the old ones
+    toggled = Toggled('Absent', None) if old[0] == 'Present' else Toggled('Present', timestamp)
+    dashboard_counters.record_change(db.session, old, toggled)
+    live_updates.publish(db.session, record_id, student_id, toggled.status, toggled.timestamp)
+    return toggled
+
+
+def bulk_set_status(record_id, status, timestamp):
+    """Set every row of a record to one status with a single UPDATE.
+
+    Returns the number of rows changed. The caller commits.
+    """
+    version = next_change_version(record_id)
+    # The old rows are only needed as counts per status and scanned-today flag
+    start = today_start()
+    scanned_today = Attendance.timestamp >= start
+    previous = db.session.execute(
+        select(Attendance.status, scanned_today, func.count())
+        .where(Attendance.record_id == record_id)
+        .group_by(Attendance.status, scanned_today)
+    ).all()
+    result = db.session.execute(
+        update(Attendance)
+        .where(Attendance.record_id == record_id)
+        .values(status=status, timestamp=timestamp, row_version=version)
+    )
+    if result.rowcount:
+        for old_status, today, count in previous:
+            dashboard_counters.record_change(db.session, (old_status, start if today else None),
+                                             (status, timestamp), count)
+        live_updates.publish(db.session, record_id, '*', status, timestamp)
+    return result.rowcount
+
+
+def set_statuses(record_id, updates, timestamp):
+    """Apply per-student statuses with set-based UPDATEs.
+
+    updates is an iterable of (student_id, status) pairs; pairs with an
+    unknown status are skipped. Students are grouped by their new status and
+    updated with one `student_id IN (...)` statement per group and chunk of
+    IN_CHUNK_SIZE ids, so at most three statements run per chunk. Present rows
+    get `timestamp`, Absent rows are cleared and Excused rows keep theirs.
+    Returns (rows changed, pairs skipped). The caller commits.
+    """
+    statuses = {}
+    skipped = 0
+    for student_id, status in updates:
+        if not student_id or status not in ATTENDANCE_STATUSES:
+            skipped += 1
+            continue
+        statuses[student_id] = status
+
+    by_status = {}
+    for student_id, status in statuses.items():
+        by_status.setdefault(status, []).append(student_id)
+
+    updated = 0
+    version = next_change_version(record_id) if by_status else None
+    for status, student_ids in by_status.items():
+        values = {'status': status, 'row_version': version}
+        if status == 'Present':
+            values['timestamp'] = timestamp
+        elif status == 'Absent':
+            values['timestamp'] = None
+        for offset in range(0, len(student_ids), IN_CHUNK_SIZE):
+            chunk = student_ids[offset:offset + IN_CHUNK_SIZE]
+            previous = _current_rows(record_id, chunk)
+            if not previous:
+                continue
+            result = db.session.execute(
+                update(Attendance)
+                .where(Attendance.record_id == record_id, Attendance.student_id.in_(list(previous)))
+                .values(**values)
+            )
+            updated += result.rowcount
+            if result.rowcount:
+                # Only the students that have a row were updated; the rest are not on the record
+                for student_id, old in previous.items():
+                    dashboard_counters.record_change(db.session, old, (status, values.get('timestamp', old[1])))
+                    live_updates.publish(db.session, record_id, student_id, status, values.get('timestamp'),
+                                         keep_timestamp=status == 'Excused')
+
+    return updated, skipped
@@ -0,0 +1,61 @@
+"""
+Columnar JSON encoding for the roster endpoints
+
+Requested with ?format=compact. Instead of one object per student the
+payload carries one array per field:
+
+    {"columns": {"student_id": [...], "year_level": [0, 2, ...], ...},
+     "dictionaries": {"year_level": ["1", "2", ...], ...}}
+
+Fields listed as categorical hold indexes into their dictionary (built in
+first-seen order), and status uses the fixed codes of STATUS_CODES so
+clients can hardcode them.
+"""
+
+import json
+from flask import request, current_app
+from services.attendance_store import ATTENDANCE_STATUSES
+
+COMPACT_FORMAT = 'compact'
+
+# Fixed integer codes for the status column: 0 Present, 1 Absent, 2 Excused
+STATUS_CODES = {status: code for code, status in enumerate(ATTENDANCE_STATUSES)}
+
+
+def wants_compact():
+    return request.args.get('format') == COMPACT_FORMAT
+
+
+def encode_columns(rows, fields, categorical=(), status_field=None):
+    """Transpose rows into column arrays.
+
+    rows are sequences (result rows, named tuples) holding `fields` in that
+    order. Returns (columns, dictionaries) ready to be placed into the payload.
+    """
+    columns = dict(zip(fields, (list(values) for values in zip(*rows)))) if rows else \
+        {field: [] for field in fields}
+    dictionaries = {}
+    for field in categorical:
+        codes = {}
+        columns[field] = [codes.setdefault(value, len(codes)) for value in columns[field]]
+        dictionaries[field] = list(codes)
+    if status_field:
+        columns[status_field] = [STATUS_CODES.get(value, -1) for value in columns[status_field]]
+        dictionaries[status_field] = list(ATTENDANCE_STATUSES)
+    return columns, dictionaries
+
+
+def compact_payload(rows, fields, categorical=(), status_field=None, **extra):
+    """The full ?format=compact body, with `extra` keys merged in at the top level"""
+    columns, dictionaries = encode_columns(rows, fields, categorical, status_field)
+    payload = {'success': True, 'format': COMPACT_FORMAT, 'count': len(rows)}
+    payload.update(extra)
+    payload['columns'] = columns
+    payload['dictionaries'] = dictionaries
+    return payload
+
+
+def json_response(payload):
+    """Serialize without whitespace (the ETag comes from services.conditional)"""
+    return current_app.response_class(json.dumps(payload, separators=(',', ':')),
+                                      mimetype='application/json')
@@ -0,0 +1,116 @@
+"""
+ETag / If-None-Match support driven by cheap change markers
+
+A marker is a small tuple that changes whenever the data behind a page
+changes: a record's change_version (bumped by every attendance write), the
+versions of an event's records, or the students table's row count and last
+update time. It is read with one indexed query (two for record searches,
+which also depend on the students table). The ETag hashes the marker
+together with the endpoint and the query arguments the view reads, so a
+client that already holds
+the current representation gets 304 Not Modified before the view runs any
+report query, export or template.
+
+The same ETag keys services.report_cache: conditional(..., cache='body')
+serves and stores the rendered body in the memory tier, cache='file' hands
+the view a slot (see cache_slot) for export files on the disk tier.
+"""
+
+import hashlib
+from functools import wraps
+from flask import request, session, abort, make_response, current_app, g
+from sqlalchemy import select, func
+from models import db, Student, Event, AttendanceRecord
+from services.report_cache import report_cache
+
+
+def record_marker(record_id):
+    """Versions and names shown on record pages, or None if the record does not exist"""
+    return db.session.execute(
+        select(AttendanceRecord.change_version, AttendanceRecord.resync_version, AttendanceRecord.record_name,
+               Event.event_name, Event.event_date)
+        .join(Event, AttendanceRecord.event_id == Event.event_id)
+        .where(AttendanceRecord.record_id == record_id)
+    ).first()
+
+
+def event_marker(event_id):
+    """The event's names plus (record_id, name, version) of each of its records"""
+    rows = db.session.execute(
+        select(Event.event_name, Event.event_date, AttendanceRecord.record_id, AttendanceRecord.record_name,
+               AttendanceRecord.change_version, AttendanceRecord.resync_version)
+        .outerjoin(AttendanceRecord, AttendanceRecord.event_id == Event.event_id)
+        .where(Event.event_id == event_id)
+        .order_by(AttendanceRecord.record_id)
+    ).all()
+    return [tuple(row) for row in rows] or None
+
+
+def students_marker():
+    """Row count and newest update time of the students table"""
+    return tuple(db.session.execute(select(func.count(), func.max(Student.updated_at))).one())
+
+
+def record_search_marker(record_id):
+    """record_marker plus students_marker: record searches also go through the student search index"""
+    marker = record_marker(record_id)
+    return None if marker is None else (tuple(marker), students_marker())
+
+
+def make_etag(marker, args=()):
+    # Accept is part of the key: students.search serves HTML and JSON from one URL
+    values = [(name, request.args.getlist(name)) for name in args]
+    key = repr((request.endpoint, marker, values, request.headers.get('Accept')))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def cache_slot():
+    """The report cache slot of the current request (set by conditional)"""
+    return g.get('report_cache_slot')
+
+
+def conditional(marker_func, cache=None, args=()):
+    """Decorate a GET view with an ETag computed from marker_func(**view_args).
+
+    args names every query argument the view reads. Only those go into the
+    ETag (and so into the report cache key), so any other argument neither
+    changes the answer nor creates a cache entry.
+
+    A marker of None means the object does not exist (404). A request whose
+    If-None-Match holds the current ETag gets 304 without calling the view.
+    Pages rendered while flash messages are pending are sent untagged, so
+    neither the message nor its absence gets cached.
+
+    cache='body' also serves the view's body from the report cache and
+    stores it on a miss; cache='file' only exposes the slot to the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            marker = marker_func(**kwargs)
+            if marker is None:
+                abort(404)
+            etag = make_etag(marker, args)
+            flashes_pending = bool(session.get('_flashes'))
+            slot = None
+            if cache and not flashes_pending:
+                group = (marker_func.__name__,) + tuple(sorted(kwargs.items()))
+                slot = g.report_cache_slot = (group, repr(marker), etag)
+            cached = report_cache.get(slot) if cache == 'body' and slot else None
+            if etag in request.if_none_match and not flashes_pending:
+                response = current_app.response_class(status=304)
+            elif cached is not None:
+                response = current_app.response_class(cached.body, mimetype=cached.mimetype)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200 or flashes_pending:
+                    return response
+                if cache == 'body' and not response.is_streamed:
+                    report_cache.put(slot, response.get_data(), response.mimetype)
+            response.set_etag(etag)
+            # Let browsers keep the copy but revalidate it on every use
+            if not response.cache_control.max_age:
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,203 @@
+"""
+Cached dashboard counters for main.index and reports.summary
+
+The snapshot (totals, per-status counts and today's scans) lives in memory
+and is adjusted when a transaction commits:
+
+* ORM inserts and deletes of students, events, records and attendance rows
+  are picked up from the session automatically and applied as exact deltas;
+* the status writers in services.attendance_store know the status and
+  timestamp of the rows they change and record the exact delta of each
+  change (record_change);
+* scan upserts, which would need an extra read per scan to tell inserts
+  from updates, and changes that cascade (deleting students, events or
+  records) mark the snapshot dirty.
+
+A dirty snapshot is recomputed on the next read, but at most once every
+DASHBOARD_MIN_RECONCILE_SECONDS. A background job also reconciles it every
+DASHBOARD_RECONCILE_SECONDS as a safety net, which keeps several worker
+processes and any out-of-band writes converged. Reading the dashboard is
+otherwise free.
+"""
+
+import time
+import threading
+from datetime import datetime, date
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+from models import db, Student, Event, AttendanceRecord, Attendance
+
+SESSION_KEY = 'dashboard_counter_deltas'
+
+
+def today_start():
+    """Start of today, the cut-off of the today_attendance counter"""
+    return datetime.combine(date.today(), datetime.min.time())
+
+
+class DashboardCounters:
+    """Thread-safe in-process snapshot of the dashboard statistics"""
+
+    def __init__(self):
+        self.app = None
+        self.reconcile_interval = 300
+        self.min_reconcile_interval = 10
+        self._snapshot = None
+        self._dirty = True
+        self._last_reconcile = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._listening = False
+        self.reconciles = 0
+
+    def init_app(self, app):
+        """Read settings, hook into session commits and start the reconcile job"""
+        self.app = app
+        self.reconcile_interval = app.config.get('DASHBOARD_RECONCILE_SECONDS', 300)
+        self.min_reconcile_interval = app.config.get('DASHBOARD_MIN_RECONCILE_SECONDS', 10)
+        app.extensions['dashboard_counters'] = self
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+            self._listening = True
+        if self.reconcile_interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dashboard-reconcile', daemon=True)
+            self._thread.start()
+
+    def snapshot(self):
+        """Return the current counters, reconciling first if they are stale"""
+        with self._lock:
+            stale = (
+                self._snapshot is None
+                or self._snapshot['day'] != date.today()
+                or (self._dirty and time.monotonic() - self._last_reconcile >= self.min_reconcile_interval)
+            )
+            if not stale:
+                return dict(self._snapshot)
+        return self.reconcile()
+
+    def reconcile(self):
+        """Recount everything from the database (two queries)"""
+        today = date.today()
+        today_start = datetime.combine(today, datetime.min.time())
+        count = lambda model: select(func.count()).select_from(model).scalar_subquery()
+        totals = db.session.execute(select(
+            count(Student),
+            count(Event),
+            count(AttendanceRecord),
+            select(func.count()).select_from(Attendance).where(Attendance.timestamp >= today_start).scalar_subquery()
+        )).one()
+        by_status = dict(db.session.execute(
+            select(Attendance.status, func.count()).group_by(Attendance.status)
+        ).all())
+
+        snapshot = {
+            'day': today,
+            'total_students': totals[0],
+            'total_events': totals[1],
+            'total_records': totals[2],
+            'today_attendance': totals[3],
+            'total_attendance': sum(by_status.values()),
+            'present_count': by_status.get('Present', 0),
+            'absent_count': by_status.get('Absent', 0),
+            'excused_count': by_status.get('Excused', 0)
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self._dirty = False
+            self._last_reconcile = time.monotonic()
+            self.reconciles += 1
+            return dict(snapshot)
+
+    def record(self, session, **deltas):
+        """Queue exact counter deltas to apply when `session` commits"""
+        pending = session.info.setdefault(SESSION_KEY, {})
+        for name, delta in deltas.items():
+            pending[name] = pending.get(name, 0) + delta
+
+    def record_change(self, session, old, new, count=1):
+        """Queue the deltas of `count` attendance rows changing from old to new.
+
+        old and new are (status, timestamp) pairs; old is None for inserted rows.
+        """
+        start = today_start()
+        deltas = {}
+        changes = [(new, count)]
+        if old is None:
+            deltas['total_attendance'] = count
+        else:
+            changes.append((old, -count))
+        for (status, timestamp), delta in changes:
+            name = f"{(status or 'Absent').lower()}_count"
+            deltas[name] = deltas.get(name, 0) + delta
+            if timestamp and timestamp >= start:
+                deltas['today_attendance'] = deltas.get('today_attendance', 0) + delta
+        self.record(session, **deltas)
+
+    def mark_dirty(self, session):
+        """Flag the snapshot for recounting when `session` commits"""
+        session.info.setdefault(SESSION_KEY, {})['dirty'] = 1
+
+    def stats(self):
+        with self._lock:
+            return {'dirty': self._dirty, 'reconciles': self.reconciles}
+
+    def _apply(self, deltas):
+        with self._lock:
+            if deltas.pop('dirty', 0):
+                self._dirty = True
+            if self._snapshot is None:
+                return
+            for name, delta in deltas.items():
+                self._snapshot[name] = self._snapshot.get(name, 0) + delta
+
+    def _after_flush(self, session, flush_context):
+        start = today_start()
+        for obj in session.new:
+            if isinstance(obj, Student):
+                self.record(session, total_students=1)
+            elif isinstance(obj, Event):
+                self.record(session, total_events=1)
+            elif isinstance(obj, AttendanceRecord):
+                self.record(session, total_records=1)
+            elif isinstance(obj, Attendance):
+                status = obj.status or 'Absent'
+                self.record(session, total_attendance=1, **{f'{status.lower()}_count': 1})
+                if obj.timestamp and obj.timestamp >= start:
+                    self.record(session, today_attendance=1)
+        for obj in session.deleted:
+            # Deletes cascade to attendance rows, so recount
+            if isinstance(obj, Student):
+                self.record(session, total_students=-1)
+                self.mark_dirty(session)
+            elif isinstance(obj, Event):
+                self.record(session, total_events=-1)
+                self.mark_dirty(session)
+            elif isinstance(obj, (AttendanceRecord, Attendance)):
+                self.mark_dirty(session)
+        for obj in session.dirty:
+            if isinstance(obj, Attendance):
+                self.mark_dirty(session)
+
+    def _after_commit(self, session):
+        deltas = session.info.pop(SESSION_KEY, None)
+        if deltas:
+            self._apply(deltas)
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(SESSION_KEY, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                with self.app.app_context():
+                    self.reconcile()
+                    db.session.remove()
+            except Exception as e:
+                self.app.logger.warning(f'Dashboard counter reconcile failed: {e}')
+
+
+dashboard_counters = DashboardCounters()
@@ -0,0 +1,198 @@
+"""
+Background export jobs
+
+Large Excel exports can take longer than a proxy lets a request run, so the
+export job routes hand the build to a small worker pool and return at once
+with a job id. Clients poll the status route for progress (rows written out
+of the report's row count) and fetch the finished file from the download
+route.
+
+Jobs are keyed by what they export and the record/event change marker it
+was read at, so identical requests coalesce: while a job for the same key is
+queued, running or finished, submit returns that job instead of starting
+another one. Once the data changes the marker does too and the next request
+starts a fresh job.
+
+Finished files live under EXPORT_JOB_DIR and are removed, together with the
+job, EXPORT_JOB_TTL_SECONDS after the job finished. Like the report cache,
+jobs are per process; on startup only this module's files (JOB_FILE_PREFIX)
+older than the TTL are removed, anything else in the directory is left alone.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+# Finished files are named JOB_FILE_PREFIX + job id + extension
+JOB_FILE_PREFIX = 'export_job_'
+
+
+class ExportJob:
+    """State of one export, updated by the worker and read by the status route"""
+
+    def __init__(self, key, download_name, mimetype):
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.download_name = download_name
+        self.mimetype = mimetype
+        self.state = QUEUED
+        self.rows_done = 0
+        self.rows_total = None
+        self.path = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.requests = 1
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def progress(self, done, total):
+        self.rows_done, self.rows_total = done, total
+
+    def to_dict(self):
+        if self.state == FINISHED:
+            fraction = 1.0
+        elif self.rows_total:
+            fraction = round(self.rows_done / self.rows_total, 4)
+        else:
+            fraction = 0.0
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'rows_done': self.rows_done,
+            'rows_total': self.rows_total,
+            'progress': fraction,
+            'download_name': self.download_name,
+            'error': self.error,
+            'requests': self.requests,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class ExportJobManager:
+    """Runs export builds on a thread pool and coalesces identical requests"""
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.ttl = 3600
+        self.directory = None
+        self._executor = None
+        self._jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self.counters = {'submitted': 0, 'coalesced': 0, 'finished': 0, 'failed': 0}
+
+    def init_app(self, app):
+        """Read settings and remove expired files left by jobs of a previous run"""
+        self.app = app
+        self.workers = app.config.get('EXPORT_JOB_WORKERS', 2)
+        self.ttl = app.config.get('EXPORT_JOB_TTL_SECONDS', 3600)
+        self.directory = app.config.get('EXPORT_JOB_DIR') or os.path.join(app.instance_path, 'export_jobs')
+        app.extensions['export_jobs'] = self
+        os.makedirs(self.directory, exist_ok=True)
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            if not entry.name.startswith(JOB_FILE_PREFIX) or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                # Another process sharing the directory removed it first
+                pass
+
+    @staticmethod
+    def job_key(*parts):
+        """Coalescing key from the export kind, its arguments and the data marker"""
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def submit(self, key, build, download_name, mimetype):
+        """Start build(progress) in the pool, or join the job already running for key.
+
+        build must return the path of a finished file, which the job takes
+        over. It runs in its own app context, so it must not touch ORM
+        objects loaded by the request. Returns (job, started).
+        """
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and job.state != FAILED:
+                job.requests += 1
+                self.counters['coalesced'] += 1
+                return job, False
+            job = ExportJob(key, download_name, mimetype)
+            self._jobs[job.job_id] = job
+            self._by_key[key] = job.job_id
+            self.counters['submitted'] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export-job')
+        self._executor.submit(self._run, job, build)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['workers'] = self.workers
+            stats['jobs'] = len(self._jobs)
+            stats['active'] = sum(1 for job in self._jobs.values() if job.active)
+            return stats
+
+    def shutdown(self):
+        """Wait for running jobs and stop the pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _run(self, job, build):
+        job.state = RUNNING
+        try:
+            with self.app.app_context():
+                path = build(job.progress)
+            target = os.path.join(self.directory, JOB_FILE_PREFIX + job.job_id + os.path.splitext(path)[1])
+            shutil.move(path, target)
+        except Exception as e:
+            self.app.logger.error(f'Export job {job.job_id} failed: {e}')
+            job.error = str(e)
+            # finished_at before the state: _prune only looks at jobs that are no longer active
+            job.finished_at = time.time()
+            job.state = FAILED
+            self.counters['failed'] += 1
+        else:
+            job.path = target
+            job.finished_at = time.time()
+            job.state = FINISHED
+            self.counters['finished'] += 1
+
+    def _prune(self):
+        """Drop finished jobs (and their files) older than the TTL; lock held"""
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.active or job.finished_at is None or job.finished_at > cutoff:
+                continue
+            del self._jobs[job_id]
+            if self._by_key.get(job.key) == job_id:
+                del self._by_key[job.key]
+            if job.path and os.path.exists(job.path):
+                # Downloads already streaming the file keep their open handle
+                os.remove(job.path)
+
+
+export_jobs = ExportJobManager()
@@ -0,0 +1,394 @@
+"""
+Streaming report exports
+
+Rows are read through a server-side cursor (yield_per) and written out in
+small batches, so memory stays flat no matter how large the report is.
+"""
+
+import io
+import os
+import csv
+import zlib
+import tempfile
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from flask import Response, stream_with_context, send_file, current_app
+from sqlalchemy import select, func, case, DateTime
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from models import db, Attendance, AttendanceRecord
+from services.report_cache import report_cache
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Same cap the old column-width pass used
+MAX_COLUMN_WIDTH = 50
+
+# Length of a '%Y-%m-%d %H:%M:%S' timestamp
+TIMESTAMP_WIDTH = 19
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+# Column order shared by the CSV and Excel exports
+RECORD_HEADERS = ['Student ID', 'First Name', 'Year Level', 'Course', 'Status', 'Timestamp']
+EVENT_HEADERS = RECORD_HEADERS + ['Record']
+
+# Pivot summary sheet of the multi-sheet event workbook
+SUMMARY_STATUSES = ('Present', 'Absent', 'Excused')
+SUMMARY_HEADERS = ['Record'] + list(SUMMARY_STATUSES) + ['Total', 'Attendance Rate']
+
+# Excel rejects these characters in sheet titles and caps titles at 31 characters
+INVALID_TITLE_CHARS = '[]:*?/\\'
+MAX_SHEET_TITLE = 31
+
+
+def record_rows_query(record_id):
+    """Attendance rows of one record, ordered by student"""
+    return select(
+        Attendance.student_id,
+        Attendance.student_fname,
+        Attendance.student_year_level,
+        Attendance.student_course,
+        Attendance.status,
+        Attendance.timestamp
+    ).where(Attendance.record_id == record_id).order_by(Attendance.student_id)
+
+
+def event_rows_query(event_id):
+    """Attendance rows of every record of an event, record by record"""
+    return select(
+        Attendance.student_id,
+        Attendance.student_fname,
+        Attendance.student_year_level,
+        Attendance.student_course,
+        Attendance.status,
+        Attendance.timestamp,
+        AttendanceRecord.record_name
+    ).join(AttendanceRecord, Attendance.record_id == AttendanceRecord.record_id)\
+        .where(AttendanceRecord.event_id == event_id)\
+        .order_by(AttendanceRecord.created_at, AttendanceRecord.record_id, Attendance.student_id)
+
+
+def iter_export_rows(query):
+    """Yield report rows as lists with the timestamp already formatted"""
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        row = list(row)
+        row[5] = row[5].strftime('%Y-%m-%d %H:%M:%S') if row[5] else ''
+        yield row
+
+
+def iter_csv(preamble, rows):
+    """Encode preamble rows and then data rows as UTF-8 CSV chunks.
+
+    The preamble is yielded before `rows` is first advanced, so the client
+    receives the first bytes before the report query has run.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        chunk = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerows(preamble)
+    yield drain()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield drain()
+            pending = 0
+    if pending:
+        yield drain()
+
+
+def iter_gzip(chunks):
+    """Compress a byte stream into a gzip stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def set_attachment(response, download_name):
+    """Add a Content-Disposition header the way send_file does"""
+    try:
+        download_name.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    except UnicodeEncodeError:
+        simple = download_name.encode('ascii', 'ignore').decode('ascii') or 'report'
+        response.headers.set('Content-Disposition', 'attachment', filename=simple,
+                             **{'filename*': f"UTF-8''{quote(download_name)}"})
+    return response
+
+
+def csv_response(preamble, rows, download_name, compress=False, cache_slot=None):
+    """Stream a CSV report as an attachment, optionally gzip-compressed.
+
+    With a report cache slot, a cached copy is sent instead when there is one,
+    otherwise the stream is copied into the cache as it goes out (`rows` is
+    never advanced on a hit).
+    """
+    mimetype = 'text/csv'
+    if compress:
+        mimetype = 'application/gzip'
+        download_name += '.gz'
+    cached = report_cache.get_file(cache_slot) if cache_slot else None
+    if cached:
+        return file_response(cached, download_name, mimetype, remove=False)
+
+    chunks = iter_csv(preamble, rows)
+    if compress:
+        chunks = iter_gzip(chunks)
+    if cache_slot:
+        chunks = report_cache.tee(cache_slot, chunks)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    return set_attachment(response, download_name)
+
+
+def measure_report(query):
+    """Row count and the longest value per column, in one aggregate query.
+
+    Returns (row_count, [max length per column]). Timestamps are measured as
+    their formatted width.
+    """
+    rows = query.order_by(None).subquery()
+    measures = [func.count()]
+    for column in rows.columns:
+        if isinstance(column.type, DateTime):
+            measures.append(func.max(case((column.isnot(None), TIMESTAMP_WIDTH), else_=0)))
+        else:
+            measures.append(func.max(func.char_length(column)))
+    result = db.session.execute(select(*measures).select_from(rows)).one()
+    return result[0], [length or 0 for length in result[1:]]
+
+
+def column_widths(headers, value_lengths, preamble_lengths=()):
+    """Column widths computed from measured lengths, like the old per-cell pass"""
+    widths = []
+    for index, header in enumerate(headers):
+        longest = max(len(header), value_lengths[index] if index < len(value_lengths) else 0)
+        if index == 0 and preamble_lengths:
+            longest = max(longest, *preamble_lengths)
+        widths.append(min(longest + 2, MAX_COLUMN_WIDTH))
+    return widths
+
+
+def write_report_sheet(workbook, title, preamble, headers, rows, widths):
+    """Append a styled report sheet to a write-only workbook.
+
+    The preamble lines go in column A (bold), followed by a blank row, the
+    grey header row and then `rows`. Widths must be known up front because a
+    write-only sheet emits its column definitions before the first row.
+    """
+    ws = workbook.create_sheet(title)
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    preamble_font = Font(bold=True, size=12)
+    for line in preamble:
+        cell = WriteOnlyCell(ws, value=line)
+        cell.font = preamble_font
+        ws.append([cell])
+    ws.append([])
+
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row in rows:
+        ws.append(row)
+    return ws
+
+
+def report_progress(rows, total, progress):
+    """Pass rows through, calling progress(done, total) once per batch and at the end"""
+    done = 0
+    progress(done, total)
+    for row in rows:
+        yield row
+        done += 1
+        if done % EXPORT_BATCH_SIZE == 0:
+            progress(done, total)
+    progress(done, total)
+
+
+def excel_report_file(title, preamble, headers, query, progress=None):
+    """Write a single-sheet report for `query` to a temporary .xlsx file.
+
+    `preamble` may be a callable taking the row count, for headers such as
+    "Total Students". `progress`, if given, is called as progress(rows
+    written, row count) while the sheet is filled. Returns the file path;
+    the caller removes it.
+    """
+    row_count, value_lengths = measure_report(query)
+    if callable(preamble):
+        preamble = preamble(row_count)
+    widths = column_widths(headers, value_lengths, [len(str(line)) for line in preamble])
+
+    rows = iter_export_rows(query)
+    if progress:
+        rows = report_progress(rows, row_count, progress)
+    workbook = openpyxl.Workbook(write_only=True)
+    write_report_sheet(workbook, title, preamble, headers, rows, widths)
+    return save_workbook(workbook)
+
+
+def sheet_title(name, used):
+    """A valid, unique (case-insensitively, within `used`) sheet title for `name`"""
+    title = ''.join('_' if char in INVALID_TITLE_CHARS else char for char in str(name)).strip("'")
+    title = title[:MAX_SHEET_TITLE] or 'Sheet'
+    candidate, number = title, 2
+    while candidate.lower() in used:
+        suffix = f' ({number})'
+        candidate = title[:MAX_SHEET_TITLE - len(suffix)] + suffix
+        number += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def event_summary(event_id):
+    """Status counts per record of an event in export order, from one GROUP BY query.
+
+    Returns a list of (record_id, record_name, counts) where counts maps
+    each of SUMMARY_STATUSES and 'total' to a number.
+    """
+    query = select(
+        AttendanceRecord.record_id,
+        AttendanceRecord.record_name,
+        Attendance.status,
+        func.count(Attendance.student_id)
+    ).outerjoin(Attendance, Attendance.record_id == AttendanceRecord.record_id)\
+        .where(AttendanceRecord.event_id == event_id)\
+        .group_by(AttendanceRecord.record_id, AttendanceRecord.record_name, AttendanceRecord.created_at,
+                  Attendance.status)\
+        .order_by(AttendanceRecord.created_at, AttendanceRecord.record_id)
+
+    records = {}
+    for record_id, record_name, status, count in db.session.execute(query):
+        _, counts = records.setdefault(record_id, (record_name, dict.fromkeys(SUMMARY_STATUSES + ('total',), 0)))
+        if status is not None:
+            counts[status] = counts.get(status, 0) + count
+            counts['total'] += count
+    return [(record_id, name, counts) for record_id, (name, counts) in records.items()]
+
+
+def summary_rows(summary):
+    """Pivot rows (one per record plus a total row) for SUMMARY_HEADERS"""
+    rows = []
+    totals = dict.fromkeys(SUMMARY_STATUSES + ('total',), 0)
+    for _, record_name, counts in summary + [(None, 'Total', totals)]:
+        rate = f"{counts['Present'] / counts['total'] * 100:.1f}%" if counts['total'] else ''
+        rows.append([record_name] + [counts[status] for status in SUMMARY_STATUSES] + [counts['total'], rate])
+        if counts is not totals:
+            for key in totals:
+                totals[key] += counts[key]
+    return rows
+
+
+def fetch_record_rows(app, record_id):
+    """Formatted export rows of one record and the longest value per column.
+
+    Runs in a sheet worker thread, with its own app context and session.
+    """
+    with app.app_context():
+        rows = list(iter_export_rows(record_rows_query(record_id)))
+    lengths = [max((len(str(value)) for value in column if value is not None), default=0)
+               for column in zip(*rows)]
+    return rows, lengths
+
+
+def event_workbook_file(event_id, preamble, workers=4, progress=None):
+    """Write an event workbook with a summary sheet and one sheet per record.
+
+    The summary sheet pivots status counts by record. Record rows are
+    fetched and formatted by up to `workers` threads while this thread
+    appends finished records to the write-only workbook in export order;
+    at most `workers` records are held in memory at once. `preamble` is the
+    summary sheet's preamble, or a callable taking the total row count.
+    `progress` is called as progress(rows written, total rows) after each
+    record sheet. Returns the file path; the caller removes it.
+    """
+    app = current_app._get_current_object()
+    summary = event_summary(event_id)
+    summary_table = summary_rows(summary)
+    total = summary_table[-1][len(SUMMARY_STATUSES) + 1]
+    if callable(preamble):
+        preamble = preamble(total)
+
+    workbook = openpyxl.Workbook(write_only=True)
+    used = set()
+    summary_lengths = [max(len(str(value)) for value in column) for column in zip(*summary_table)]
+    write_report_sheet(workbook, sheet_title('Summary', used), preamble, SUMMARY_HEADERS, summary_table,
+                       column_widths(SUMMARY_HEADERS, summary_lengths, [len(str(line)) for line in preamble]))
+
+    done = 0
+    if progress:
+        progress(done, total)
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='export-sheet') as pool:
+        records = iter(summary)
+        pending = deque((record, pool.submit(fetch_record_rows, app, record[0]))
+                        for record in islice(records, max(workers, 1)))
+        while pending:
+            (_, record_name, counts), future = pending.popleft()
+            rows, lengths = future.result()
+            following = next(records, None)
+            if following is not None:
+                pending.append((following, pool.submit(fetch_record_rows, app, following[0])))
+            sheet_preamble = [f"Record: {record_name}", f"Total Students: {len(rows)}"]
+            write_report_sheet(workbook, sheet_title(record_name, used), sheet_preamble, RECORD_HEADERS, rows,
+                               column_widths(RECORD_HEADERS, lengths, [len(line) for line in sheet_preamble]))
+            done += len(rows)
+            if progress:
+                progress(done, total)
+    return save_workbook(workbook)
+
+
+def save_workbook(workbook):
+    """Save a workbook to a temporary .xlsx file and return its path"""
+    fd, path = tempfile.mkstemp(suffix='.xlsx', prefix='report_')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            workbook.save(output)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def file_response(path, download_name, mimetype=XLSX_MIMETYPE, remove=True):
+    """Send a generated file as an attachment, deleting it once sent"""
+    response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name)
+    if remove:
+        response.call_on_close(lambda: os.path.exists(path) and os.remove(path))
+    return response
+
+
+def excel_response(build, download_name, cache_slot=None):
+    """Send the workbook `build()` writes, going through the report cache when given a slot"""
+    path = report_cache.get_file(cache_slot) if cache_slot else None
+    if path is None:
+        path = build()
+        cached = report_cache.put_file(cache_slot, path) if cache_slot else None
+        if cached is None:
+            return file_response(path, download_name)
+        path = cached
+    return file_response(path, download_name, remove=False)
@@ -0,0 +1,159 @@
+"""
+Server-sent events fan-out for live attendance updates
+
+The writers in services.attendance_store queue a compact delta per changed
+student on the session; when the transaction commits the hub serializes the
+deltas once per record and hands the message to every browser watching that
+record. Nothing is published for rolled back work, and publishing to a
+record nobody watches costs a dict lookup.
+
+Each delta is a JSON array:
+
+* [student_id, status, timestamp]  status and timestamp (ISO string or null) changed
+* [student_id, status]             status changed, timestamp left as it was
+* ["*", status, timestamp]         every student on the record (bulk marking)
+
+Each client owns a bounded buffer of SSE_CLIENT_BUFFER messages. A client
+that falls that far behind has its buffer dropped and receives a `resync`
+event, after which it should reload the record instead of replaying deltas.
+The hub is per process, like the other in-memory services.
+"""
+
+import json
+import threading
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SESSION_KEY = 'live_update_deltas'
+
+# Returned by Subscriber.get when the client overflowed and must resync
+RESYNC = object()
+
+
+class Subscriber:
+    """One SSE client's bounded message buffer"""
+
+    def __init__(self, record_id, max_messages):
+        self.record_id = record_id
+        self.max_messages = max_messages
+        self.overflowed = False
+        self._messages = deque()
+        self._ready = threading.Condition()
+
+    def push(self, message):
+        with self._ready:
+            if len(self._messages) >= self.max_messages:
+                self._messages.clear()
+                self.overflowed = True
+            else:
+                self._messages.append(message)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Next message, RESYNC after an overflow, or None on timeout"""
+        with self._ready:
+            if not self._messages and not self.overflowed:
+                self._ready.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return RESYNC
+            return self._messages.popleft() if self._messages else None
+
+
+class LiveUpdateHub:
+    """Per-record publish/subscribe hub fed by session commits"""
+
+    def __init__(self):
+        self.buffer_size = 256
+        self.heartbeat_seconds = 15
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._listening = False
+        self.published = 0
+        self.resyncs = 0
+
+    def init_app(self, app):
+        """Read settings and hook into session commits"""
+        self.buffer_size = app.config.get('SSE_CLIENT_BUFFER', 256)
+        self.heartbeat_seconds = app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+        app.extensions['live_updates'] = self
+        if not self._listening:
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+            self._listening = True
+
+    def watching(self, record_id):
+        return int(record_id) in self._subscribers
+
+    def publish(self, session, record_id, student_id, status, timestamp=None, keep_timestamp=False):
+        """Queue one delta for record_id, delivered when `session` commits"""
+        record_id = int(record_id)
+        if record_id not in self._subscribers:
+            return
+        if keep_timestamp:
+            delta = [student_id, status]
+        else:
+            delta = [student_id, status, timestamp.isoformat() if timestamp else None]
+        session.info.setdefault(SESSION_KEY, {}).setdefault(record_id, []).append(delta)
+
+    def subscribe(self, record_id):
+        subscriber = Subscriber(int(record_id), self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(subscriber.record_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            watchers = self._subscribers.get(subscriber.record_id)
+            if watchers is not None:
+                watchers.discard(subscriber)
+                if not watchers:
+                    del self._subscribers[subscriber.record_id]
+
+    def stream(self, subscriber):
+        """Generator of SSE frames for one client; unsubscribes when the client goes away"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                message = subscriber.get(self.heartbeat_seconds)
+                if message is None:
+                    yield ': keepalive\n\n'
+                elif message is RESYNC:
+                    self.resyncs += 1
+                    yield 'event: resync\ndata: {}\n\n'
+                else:
+                    yield f'event: attendance\ndata: {message}\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'records': len(self._subscribers),
+                'clients': sum(len(watchers) for watchers in self._subscribers.values()),
+                'published': self.published,
+                'resyncs': self.resyncs
+            }
+
+    def _after_commit(self, session):
+        pending = session.info.pop(SESSION_KEY, None)
+        if not pending:
+            return
+        for record_id, deltas in pending.items():
+            with self._lock:
+                watchers = list(self._subscribers.get(record_id, ()))
+            if not watchers:
+                continue
+            # Serialize once per record, every client gets the same string
+            message = json.dumps(deltas, separators=(',', ':'))
+            for subscriber in watchers:
+                subscriber.push(message)
+            self.published += 1
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(SESSION_KEY, None)
+
+
+live_updates = LiveUpdateHub()
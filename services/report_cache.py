@@ -0,0 +1,255 @@
+"""
+Versioned cache for rendered reports and generated export files
+
+Entries are keyed by the ETag that services.conditional derives from the
+endpoint, the query string and the record/event change marker, so a key
+can only ever hit for the data version it was built from. Writes to a
+record or event change its marker, which makes every older entry
+unreachable; the first store under the new version also drops the old
+version's entries right away instead of waiting for LRU eviction.
+
+Two size-bounded LRU tiers:
+
+* memory: rendered HTML pages and JSON bodies (REPORT_CACHE_MEMORY_MB);
+* disk: CSV and Excel export files under REPORT_CACHE_DIR
+  (REPORT_CACHE_DISK_MB). The disk index is rebuilt from file mtimes on
+  start, so exports survive a restart. Startup only touches files this
+  module wrote: empty entries and partial copies older than
+  PARTIAL_MAX_AGE_SECONDS are removed, anything else is left alone.
+
+A slot is the (group, version, key) triple the conditional decorator hands
+to the view; group identifies the record or event the entry belongs to.
+"""
+
+import os
+import re
+import time
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+# A rendered body held in memory
+CachedBody = namedtuple('CachedBody', ['body', 'mimetype'])
+
+CACHE_FILE_SUFFIX = '.cache'
+
+# Cache entries are named after the SHA-1 ETag of their slot
+CACHE_FILE_PATTERN = re.compile(r'[0-9a-f]{40}' + re.escape(CACHE_FILE_SUFFIX))
+
+# Copies tee() is still writing; older ones were left by a crash
+PARTIAL_FILE_PREFIX = 'report_'
+PARTIAL_FILE_SUFFIX = '.partial'
+PARTIAL_MAX_AGE_SECONDS = 3600
+
+
+class ReportCache:
+    """Thread-safe two-tier (memory, disk) LRU keyed by report ETag"""
+
+    def __init__(self):
+        self.memory_limit = 32 * 2**20
+        self.disk_limit = 512 * 2**20
+        self.directory = None
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._files = OrderedDict()
+        self._disk_bytes = 0
+        # group -> (version, keys held in either tier), and key -> group
+        self._groups = {}
+        self._key_groups = {}
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'memory_misses': 0, 'disk_hits': 0, 'disk_misses': 0,
+                         'evictions': 0, 'invalidations': 0}
+
+    def init_app(self, app):
+        """Read settings and index export files left over from a previous run"""
+        self.memory_limit = app.config.get('REPORT_CACHE_MEMORY_MB', 32) * 2**20
+        self.disk_limit = app.config.get('REPORT_CACHE_DISK_MB', 512) * 2**20
+        self.directory = app.config.get('REPORT_CACHE_DIR') or os.path.join(app.instance_path, 'report_cache')
+        app.extensions['report_cache'] = self
+        if not self.disk_limit:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        leftovers = []
+        cutoff = time.time() - PARTIAL_MAX_AGE_SECONDS
+        for entry in os.scandir(self.directory):
+            name = entry.name
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if CACHE_FILE_PATTERN.fullmatch(name):
+                    if not stat.st_size:
+                        # No export is empty: the move into place was cut short
+                        os.remove(entry.path)
+                        continue
+                    leftovers.append((stat.st_mtime, name[:-len(CACHE_FILE_SUFFIX)], stat.st_size))
+                elif (name.startswith(PARTIAL_FILE_PREFIX) and name.endswith(PARTIAL_FILE_SUFFIX)
+                      and stat.st_mtime < cutoff):
+                    # Half-written tee copy from a crash; newer ones may still be streaming
+                    os.remove(entry.path)
+            except OSError:
+                # Removed by another process sharing the directory
+                continue
+        with self._lock:
+            for _, key, size in sorted(leftovers):
+                self._files[key] = size
+                self._disk_bytes += size
+            self._trim_disk()
+
+    # Memory tier
+
+    def get(self, slot):
+        """The CachedBody stored for slot, or None"""
+        with self._lock:
+            entry = self._memory.get(slot[2])
+            if entry is None:
+                self.counters['memory_misses'] += 1
+                return None
+            self._memory.move_to_end(slot[2])
+            self.counters['memory_hits'] += 1
+            return entry
+
+    def put(self, slot, body, mimetype):
+        """Keep a rendered body; bodies over a quarter of the tier are not cached"""
+        if len(body) > self.memory_limit // 4:
+            return
+        group, version, key = slot
+        with self._lock:
+            self._claim(group, version, key)
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old.body)
+            self._memory[key] = CachedBody(body, mimetype)
+            self._memory_bytes += len(body)
+            while self._memory_bytes > self.memory_limit:
+                evicted_key, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.body)
+                self._release(evicted_key)
+                self.counters['evictions'] += 1
+
+    # Disk tier
+
+    def get_file(self, slot):
+        """Path of the export file stored for slot, or None"""
+        key = slot[2]
+        with self._lock:
+            if key in self._files and os.path.exists(self._path(key)):
+                self._files.move_to_end(key)
+                self.counters['disk_hits'] += 1
+                return self._path(key)
+            self._forget_file(key)
+            self.counters['disk_misses'] += 1
+            return None
+
+    def put_file(self, slot, path):
+        """Move a finished export file into the cache and return its new path.
+
+        Returns None (and leaves the file where it is) when the disk tier is
+        disabled or the file would take more than a quarter of it.
+        """
+        size = os.path.getsize(path)
+        if not self.disk_limit or size > self.disk_limit // 4:
+            return None
+        group, version, key = slot
+        target = self._path(key)
+        os.replace(path, target)
+        with self._lock:
+            self._forget_file(key, remove=False)
+            self._claim(group, version, key)
+            self._files[key] = size
+            self._disk_bytes += size
+            self._trim_disk(keep=key)
+        return target
+
+    def tee(self, slot, chunks):
+        """Pass a byte stream through while copying it into the disk tier.
+
+        The copy is only adopted when the stream ran to the end, so a client
+        that disconnects halfway leaves nothing behind.
+        """
+        if not self.disk_limit:
+            yield from chunks
+            return
+        fd, partial = tempfile.mkstemp(dir=self.directory, prefix=PARTIAL_FILE_PREFIX, suffix=PARTIAL_FILE_SUFFIX)
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as copy:
+                for chunk in chunks:
+                    copy.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                if self.put_file(slot, partial) is None:
+                    os.remove(partial)
+            elif os.path.exists(partial):
+                os.remove(partial)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'memory_limit': self.memory_limit,
+                'disk_entries': len(self._files),
+                'disk_bytes': self._disk_bytes,
+                'disk_limit': self.disk_limit,
+                'groups': len(self._groups)
+            })
+            return stats
+
+    # Internals (called with the lock held)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+    def _claim(self, group, version, key):
+        """Register key under group, dropping the group's entries from older versions"""
+        current_version, keys = self._groups.get(group, (None, set()))
+        if current_version != version:
+            if keys:
+                self.counters['invalidations'] += 1
+            for stale in list(keys):
+                entry = self._memory.pop(stale, None)
+                if entry is not None:
+                    self._memory_bytes -= len(entry.body)
+                self._forget_file(stale)
+                self._release(stale)
+            keys = set()
+        keys.add(key)
+        self._groups[group] = (version, keys)
+        self._key_groups[key] = group
+
+    def _release(self, key):
+        """Drop key from its group once neither tier holds it, and the group once it is empty"""
+        if key in self._memory or key in self._files:
+            return
+        group = self._key_groups.pop(key, None)
+        if group is None:
+            return
+        _, keys = self._groups[group]
+        keys.discard(key)
+        if not keys:
+            del self._groups[group]
+
+    def _forget_file(self, key, remove=True):
+        size = self._files.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        self._release(key)
+        if remove and os.path.exists(self._path(key)):
+            # Responses already streaming the file keep their open handle
+            os.remove(self._path(key))
+
+    def _trim_disk(self, keep=None):
+        while self._disk_bytes > self.disk_limit and self._files:
+            key = next(iter(self._files))
+            if key == keep:
+                break
+            self._forget_file(key)
+            self.counters['evictions'] += 1
+
+
+report_cache = ReportCache()
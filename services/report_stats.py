@@ -0,0 +1,87 @@
+"""
+SQL-side statistics and paging for the attendance reports
+"""
+
+from sqlalchemy import select, func
+from models import db, Attendance, AttendanceRecord
+from services.exports import record_rows_query, event_rows_query
+
+# Breakdown dimensions accepted by ?breakdown=
+BREAKDOWN_COLUMNS = {
+    'course': Attendance.student_course,
+    'year_level': Attendance.student_year_level
+}
+
+STATUSES = ('Present', 'Absent', 'Excused')
+
+
+def parse_breakdown(value):
+    """Turn 'course,year_level' into a tuple of known breakdown keys"""
+    if not value:
+        return ()
+    return tuple(key for key in value.split(',') if key in BREAKDOWN_COLUMNS)
+
+
+def _empty_counts():
+    counts = {'total': 0}
+    counts.update({status: 0 for status in STATUSES})
+    return counts
+
+
+def attendance_statistics(condition, breakdown=(), join_records=False):
+    """Status counts for the rows matching `condition` in one GROUP BY query.
+
+    Returns (totals, groups): totals maps 'total' and each status to a count;
+    groups is a list of dicts holding the breakdown keys plus the same counts,
+    empty when no breakdown was requested.
+    """
+    dimensions = [BREAKDOWN_COLUMNS[key].label(key) for key in breakdown]
+    query = select(*dimensions, Attendance.status, func.count().label('count'))
+    if join_records:
+        query = query.join(AttendanceRecord, Attendance.record_id == AttendanceRecord.record_id)
+    query = query.where(condition).group_by(*dimensions, Attendance.status)
+
+    totals = _empty_counts()
+    groups = {}
+    for row in db.session.execute(query):
+        status, count = row.status, row.count
+        totals['total'] += count
+        totals[status] = totals.get(status, 0) + count
+        if breakdown:
+            key = tuple(getattr(row, name) for name in breakdown)
+            group = groups.setdefault(key, dict(zip(breakdown, key), **_empty_counts()))
+            group['total'] += count
+            group[status] = group.get(status, 0) + count
+
+    return totals, [groups[key] for key in sorted(groups)]
+
+
+def record_statistics(record_id, breakdown=()):
+    return attendance_statistics(Attendance.record_id == record_id, breakdown)
+
+
+def event_statistics(event_id, breakdown=()):
+    return attendance_statistics(AttendanceRecord.event_id == event_id, breakdown, join_records=True)
+
+
+def paginate_rows(query, page, per_page, total):
+    """One page of detail rows plus the paging info the templates need"""
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+    rows = db.session.execute(query.limit(per_page).offset((page - 1) * per_page)).all()
+    return rows, {
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'total': total,
+        'has_prev': page > 1,
+        'has_next': page < pages
+    }
+
+
+def record_page(record_id, page, per_page, total):
+    return paginate_rows(record_rows_query(record_id), page, per_page, total)
+
+
+def event_page(event_id, page, per_page, total):
+    return paginate_rows(event_rows_query(event_id), page, per_page, total)
@@ -0,0 +1,297 @@
+"""
+Write-behind ingestion of QR scans
+
+In 'write_behind' mode process_qr acknowledges a scan as soon as it is
+appended to a local spool file and queued in memory. A background flusher
+writes the queue to the attendance table as batched upserts every
+SCAN_FLUSH_INTERVAL_MS milliseconds, or sooner once SCAN_FLUSH_BATCH_SIZE
+scans are waiting. Spool segments are only deleted after their batch has
+committed, and leftovers are replayed on startup, so a crash loses nothing
+that was acknowledged.
+
+Only integrity and data errors are permanent: those rows (and rows whose
+record or student was deleted after the scan was acknowledged) go to the
+.rejected file. Any other failure, such as a lost connection, keeps the
+whole batch and its spool segments and retries it with exponential backoff
+before new scans are taken from the queue.
+"""
+
+import os
+import json
+import glob
+import atexit
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, DataError
+from models import db, Student, AttendanceRecord
+from services.attendance_store import upsert_attendance, attendance_row
+
+SYNC = 'sync'
+WRITE_BEHIND = 'write_behind'
+
+# Errors that retrying cannot fix; the offending rows are rejected
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+# Upper bound of the retry backoff after a failed flush, in seconds
+MAX_RETRY_BACKOFF = 30.0
+
+
+class ScanIngestor:
+    """Queues scans in memory, backed by an append-only spool file"""
+
+    def __init__(self):
+        self.app = None
+        self.mode = SYNC
+        self.flush_interval = 0.2
+        self.batch_size = 500
+        self.spool_path = None
+        self.fsync = False
+        self._pending = []
+        # Batch of a failed flush, retried before anything in _pending; it owns _segments
+        self._retry = []
+        self._retry_at = 0
+        self._backoff = 0
+        self._segments = []
+        self._segment_seq = 0
+        self._spool = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.flushed = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        """Read settings from the app config and start the flusher if enabled"""
+        self.app = app
+        self.mode = app.config.get('SCAN_INGEST_MODE', SYNC)
+        self.flush_interval = app.config.get('SCAN_FLUSH_INTERVAL_MS', 200) / 1000.0
+        self.batch_size = app.config.get('SCAN_FLUSH_BATCH_SIZE', 500)
+        self.spool_path = app.config.get('SCAN_SPOOL_PATH') or os.path.join(app.instance_path, 'scan_spool.jsonl')
+        self.fsync = app.config.get('SCAN_SPOOL_FSYNC', False)
+        app.extensions['scan_ingestor'] = self
+        if self.mode == WRITE_BEHIND:
+            self.start()
+
+    @property
+    def write_behind(self):
+        return self.mode == WRITE_BEHIND
+
+    def start(self):
+        """Replay leftover spool segments and start the background flusher"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        with self._lock:
+            self._recover_spool()
+            self._spool = open(self.spool_path, 'a', encoding='utf-8')
+            self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='scan-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush whatever is queued and stop the flusher"""
+        if not self._thread:
+            return
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join()
+        self._thread = None
+        self.flush(force=True)
+        with self._lock:
+            if self._spool:
+                self._spool.close()
+                self._spool = None
+
+    def submit(self, record_id, student, status='Present', timestamp=None):
+        """Spool and queue one scan; returns once it is safe on disk"""
+        entry = attendance_row(record_id, student, status, (timestamp or datetime.now()).isoformat())
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        return entry
+
+    def stats(self):
+        """Queue depth and flush counters"""
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'pending': len(self._pending),
+                'retrying': len(self._retry),
+                'retry_backoff': self._backoff,
+                'flushed': self.flushed,
+                'rejected': self.rejected,
+                'spool_segments': len(self._segments)
+            }
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._retry:
+                    timeout = self._retry_at - time.monotonic()
+                elif len(self._pending) < self.batch_size:
+                    timeout = self.flush_interval
+                else:
+                    timeout = 0
+                if not self._stopping and timeout > 0:
+                    self._wakeup.wait(timeout)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self, force=False):
+        """Write queued scans to the database; returns the number written.
+
+        A batch that failed earlier is retried first, once its backoff has
+        passed (or right away with force=True), and on its own: new scans
+        wait in the active spool until it has gone through.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._retry:
+                    if not force and time.monotonic() < self._retry_at:
+                        return 0
+                    batch = self._retry
+                elif self._pending:
+                    batch, self._pending = self._pending, []
+                    self._rotate_spool()
+                else:
+                    return 0
+                confirmed_segments = list(self._segments)
+
+            with self.app.app_context():
+                try:
+                    written = self._write(batch)
+                except Exception as e:
+                    with self._lock:
+                        self._retry = batch
+                        self._backoff = min(max(self._backoff * 2, self.flush_interval, 0.1), MAX_RETRY_BACKOFF)
+                        self._retry_at = time.monotonic() + self._backoff
+                    self.app.logger.error(f'Scan flush of {len(batch)} scans failed, '
+                                          f'retrying in {self._backoff:.1f}s: {e}')
+                    return 0
+                finally:
+                    db.session.remove()
+
+            with self._lock:
+                for path in confirmed_segments:
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._segments = [path for path in self._segments if path not in confirmed_segments]
+                self._retry = []
+                self._backoff = 0
+                self.flushed += written
+            return written
+
+    def _write(self, batch):
+        """Upsert a batch, rejecting rows that can never be written.
+
+        Raises on anything else (lost connection, lock timeout, ...) so the
+        caller keeps the batch. Rows already committed by the row-by-row pass
+        are simply upserted again on the retry.
+        """
+        rows, orphans = self._split_orphans([dict(entry, timestamp=datetime.fromisoformat(entry['timestamp']))
+                                             for entry in batch])
+        written = self._write_rows(rows) if rows else 0
+        # Rejected only once the batch went through, so a retry does not reject them twice
+        for row, reason in orphans:
+            self._reject(row, reason)
+        return written
+
+    def _write_rows(self, rows):
+        try:
+            upsert_attendance(rows)
+            db.session.commit()
+            return len(rows)
+        except PERMANENT_ERRORS:
+            db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # One bad row must not block the rest of the batch
+        written = 0
+        for row in rows:
+            try:
+                upsert_attendance([row])
+                db.session.commit()
+                written += 1
+            except PERMANENT_ERRORS as e:
+                db.session.rollback()
+                self._reject(row, e)
+            except Exception:
+                db.session.rollback()
+                raise
+        return written
+
+    def _split_orphans(self, rows):
+        """Separate rows whose record or student was deleted after the scan was acknowledged.
+
+        Returns (rows to write, [(orphan row, reason), ...]).
+        """
+        record_ids = {row['record_id'] for row in rows}
+        student_ids = {row['student_id'] for row in rows}
+        existing_records = set(db.session.execute(
+            select(AttendanceRecord.record_id).where(AttendanceRecord.record_id.in_(record_ids))).scalars())
+        existing_students = set(db.session.execute(
+            select(Student.student_id).where(Student.student_id.in_(student_ids))).scalars())
+        kept, orphans = [], []
+        for row in rows:
+            if row['record_id'] not in existing_records:
+                orphans.append((row, 'attendance record no longer exists'))
+            elif row['student_id'] not in existing_students:
+                orphans.append((row, 'student no longer exists'))
+            else:
+                kept.append(row)
+        return kept, orphans
+
+    def _reject(self, row, error):
+        self.rejected += 1
+        self.app.logger.error(f"Rejected scan {row['student_id']} for record {row['record_id']}: {error}")
+        with open(self.spool_path + '.rejected', 'a', encoding='utf-8') as rejected_file:
+            rejected_file.write(json.dumps(dict(row, timestamp=row['timestamp'].isoformat(), error=str(error))) + '\n')
+
+    def _rotate_spool(self):
+        # Called with self._lock held: freeze the active spool as a segment
+        if self._spool is None:
+            return
+        self._spool.close()
+        self._segment_seq += 1
+        segment = f'{self.spool_path}.{os.getpid()}.{self._segment_seq}.flushing'
+        os.replace(self.spool_path, segment)
+        self._segments.append(segment)
+        self._spool = open(self.spool_path, 'a', encoding='utf-8')
+
+    def _recover_spool(self):
+        # Called with self._lock held before the active spool is opened
+        # Leftovers become the retry batch, so they are written before any new scan
+        leftovers = sorted(glob.glob(self.spool_path + '.*.flushing'), key=os.path.getmtime)
+        if os.path.exists(self.spool_path):
+            self._segment_seq += 1
+            segment = f'{self.spool_path}.{os.getpid()}.{self._segment_seq}.flushing'
+            os.replace(self.spool_path, segment)
+            leftovers.append(segment)
+        for path in leftovers:
+            with open(path, encoding='utf-8') as segment_file:
+                for line in segment_file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._retry.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-write was never acknowledged
+                        continue
+            self._segments.append(path)
+
+
+scan_ingestor = ScanIngestor()
@@ -0,0 +1,139 @@
+"""
+In-process student roster cache used by the scanner hot path
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Student
+
+SESSION_KEY = 'student_cache_invalidations'
+
+# Immutable snapshot of the Student columns the scanner needs
+CachedStudent = namedtuple('CachedStudent', ['student_id', 'fname', 'year_level', 'course'])
+
+
+class StudentCache:
+    """Thread-safe student lookup cache keyed by student_id.
+
+    With max_entries == 0 the whole masterlist is kept in memory. A positive
+    max_entries bounds the cache and evicts the least recently used students.
+    Misses fall through to the database, so the cache never answers "not
+    found" on its own. Each process holds its own copy; ORM writes to Student
+    invalidate the students they touch when their transaction commits.
+    """
+
+    def __init__(self, max_entries=0):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a miss that read the old row does not store it
+        self._generation = 0
+        self._listening = False
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Read settings from the app config, hook into session commits and warm the cache"""
+        self.max_entries = app.config.get('STUDENT_CACHE_MAX_ENTRIES', 0)
+        app.extensions['student_cache'] = self
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+            self._listening = True
+        with app.app_context():
+            try:
+                self.warm()
+            except Exception as e:
+                # The scanner still works cold, every lookup just goes to the database
+                app.logger.warning(f'Student cache warm-up failed: {e}')
+
+    def warm(self):
+        """Load the roster (or its first max_entries students) into memory"""
+        query = db.session.query(Student.student_id, Student.fname, Student.year_level, Student.course)\
+            .order_by(Student.student_id)
+        if self.max_entries:
+            query = query.limit(self.max_entries)
+        with self._lock:
+            generation = self._generation
+        rows = [CachedStudent(*row) for row in query]
+        with self._lock:
+            if generation != self._generation:
+                # A commit changed students while the roster was read; stay cold rather than stale
+                return 0
+            self._entries.clear()
+            for row in rows:
+                self._entries[row.student_id] = row
+        return len(rows)
+
+    def get(self, student_id):
+        """Return the CachedStudent for student_id, or None if it does not exist"""
+        with self._lock:
+            student = self._entries.get(student_id)
+            if student is not None:
+                self.hits += 1
+                if self.max_entries:
+                    self._entries.move_to_end(student_id)
+                return student
+            self.misses += 1
+            generation = self._generation
+
+        row = db.session.query(Student.student_id, Student.fname, Student.year_level, Student.course)\
+            .filter(Student.student_id == student_id).first()
+        if row is None:
+            return None
+        student = CachedStudent(*row)
+        self._store(student, generation)
+        return student
+
+    def _store(self, student, generation):
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while the row was read; it may be the old version
+                return
+            self._entries[student.student_id] = student
+            if self.max_entries:
+                self._entries.move_to_end(student.student_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, *student_ids):
+        """Drop the given students, or everything when called without ids"""
+        with self._lock:
+            self._generation += 1
+            if not student_ids:
+                self._entries.clear()
+                return
+            for student_id in student_ids:
+                self._entries.pop(student_id, None)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+    def _after_flush(self, session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Student):
+                session.info.setdefault(SESSION_KEY, set()).add(obj.student_id)
+
+    def _after_commit(self, session):
+        student_ids = session.info.pop(SESSION_KEY, None)
+        if student_ids:
+            self.invalidate(*student_ids)
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(SESSION_KEY, None)
+
+
+student_cache = StudentCache()
@@ -0,0 +1,324 @@
+"""
+In-process search index over the student masterlist
+
+students.search and attendance.search_attendance used to OR four
+LIKE '%q%' filters together, a full table scan per keystroke. This index
+answers the same substring question from memory:
+
+* student_id and fname are split into lowercase trigrams; a query of three
+  or more characters intersects the posting sets of its trigrams and then
+  verifies the few candidates with a real substring check;
+* year_level and course have a handful of distinct values, so they map each
+  value to its students and the query is tested against the values only.
+
+Results are ranked exact student_id first, then prefix matches on any field,
+then plain substring matches, each group ordered by student_id.
+
+For typeahead, complete() walks a sorted list of (prefix key, student_id)
+pairs, keyed by student_id, the full name and every later word of the name,
+so the top-k prefix matches cost one bisect plus k steps.
+
+Attendance rows keep a snapshot of the student's fields from when they
+were written, and record searches match what the rows show. So the index
+also remembers older versions of each student that attendance rows still
+hold: matching_ids(..., include_snapshots=True) returns their ids too, and
+the caller checks the rows' own columns (see attendance_pages).
+
+ORM writes to Student are applied when their transaction commits. Writes
+from other processes (or bulk inserts that bypass the ORM) are picked up by
+a full rebuild every STUDENT_SEARCH_REFRESH_SECONDS.
+"""
+
+import time
+import heapq
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session
+from models import db, Student, Attendance
+from services.student_cache import CachedStudent
+
+SESSION_KEY = 'student_search_changes'
+
+# Fields split into trigrams, and low-cardinality fields indexed by value
+GRAM_FIELDS = ('student_id', 'fname')
+VALUE_FIELDS = ('year_level', 'course')
+SEARCH_FIELDS = GRAM_FIELDS + VALUE_FIELDS
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def prefix_keys(student):
+    """Lowercase keys a typeahead query may be a prefix of"""
+    name = student.fname.lower()
+    keys = {student.student_id.lower(), name}
+    keys.update(name.split()[1:])
+    return keys
+
+
+class StudentSearchIndex:
+    """Thread-safe trigram/value index of the students table"""
+
+    def __init__(self):
+        self.app = None
+        self.refresh_interval = 300
+        self._students = {}
+        self._grams = {}
+        self._short = set()
+        self._values = {field: {} for field in VALUE_FIELDS}
+        self._prefixes = []
+        # student_id -> older CachedStudents still shown by attendance rows
+        self._snapshots = {}
+        self._built = False
+        self._lock = threading.RLock()
+        self._thread = None
+        self._listening = False
+        self.rebuilds = 0
+        self.searches = 0
+
+    def init_app(self, app):
+        """Read settings, build the index and keep it in sync with commits"""
+        self.app = app
+        self.refresh_interval = app.config.get('STUDENT_SEARCH_REFRESH_SECONDS', 300)
+        app.extensions['student_search'] = self
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_soft_rollback', self._after_rollback)
+            self._listening = True
+        with app.app_context():
+            try:
+                self.rebuild()
+            except Exception as e:
+                # search() builds the index on first use instead
+                app.logger.warning(f'Student search index build failed: {e}')
+        if self.refresh_interval and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='student-search-refresh', daemon=True)
+            self._thread.start()
+
+    def rebuild(self):
+        """Reload every student, and the attendance snapshots that differ from them, from the database"""
+        rows = db.session.query(Student.student_id, Student.fname, Student.year_level, Student.course).all()
+        outdated = db.session.query(Attendance.student_id, Attendance.student_fname, Attendance.student_year_level,
+                                    Attendance.student_course)\
+            .join(Student, Student.student_id == Attendance.student_id)\
+            .filter(or_(Attendance.student_fname != Student.fname,
+                        Attendance.student_year_level != Student.year_level,
+                        Attendance.student_course != Student.course))\
+            .distinct().all()
+        snapshots = {}
+        for row in outdated:
+            snapshots.setdefault(row[0], set()).add(CachedStudent(*row))
+        students = {}
+        grams = {}
+        short = set()
+        values = {field: {} for field in VALUE_FIELDS}
+        prefixes = []
+        for row in rows:
+            student = CachedStudent(*row)
+            students[student.student_id] = student
+            self._index(student, grams, short, values)
+            prefixes.extend((key, student.student_id) for key in prefix_keys(student))
+        prefixes.sort()
+        with self._lock:
+            self._students, self._grams, self._short, self._values = students, grams, short, values
+            self._prefixes = prefixes
+            self._snapshots = snapshots
+            self._built = True
+            self.rebuilds += 1
+        return len(students)
+
+    def search(self, query_text, limit=None):
+        """Students matching query_text as a substring of any field, best matches first"""
+        needle = (query_text or '').strip().lower()
+        if not needle:
+            return []
+        if not self._built:
+            self.rebuild()
+        with self._lock:
+            self.searches += 1
+            matches, prefixed = self._matching_ids(needle)
+            # Rank buckets: exact student_id, prefix of any field, everything else
+            exact = {student_id for student_id in matches if student_id.lower() == needle}
+            prefix = prefixed.union(
+                student_id for student_id in matches - prefixed
+                if any(getattr(self._students[student_id], field).lower().startswith(needle)
+                       for field in GRAM_FIELDS)
+            ) - exact
+            ordered = []
+            for bucket in (exact, prefix, matches - exact - prefix):
+                if limit is None:
+                    ordered.extend(sorted(bucket))
+                elif len(ordered) < limit:
+                    ordered.extend(heapq.nsmallest(limit - len(ordered), bucket))
+            return [self._students[student_id] for student_id in ordered]
+
+    def complete(self, query_text, limit=10):
+        """Top `limit` typeahead matches, prefix matches first in key order.
+
+        Falls back to the ranked substring search only when fewer than `limit`
+        students have a key starting with the query.
+        """
+        needle = (query_text or '').strip().lower()
+        if not needle:
+            return []
+        if not self._built:
+            self.rebuild()
+        with self._lock:
+            found = []
+            position = bisect_left(self._prefixes, (needle,))
+            while len(found) < limit and position < len(self._prefixes):
+                key, student_id = self._prefixes[position]
+                if not key.startswith(needle):
+                    break
+                if student_id not in found:
+                    found.append(student_id)
+                position += 1
+            students = [self._students[student_id] for student_id in found]
+        if len(students) < limit:
+            students.extend(student for student in self.search(needle, limit)
+                            if student.student_id not in found)
+        return students[:limit]
+
+    def matching_ids(self, query_text, include_snapshots=False):
+        """Sorted student_ids matching query_text (for keyset paging).
+
+        include_snapshots adds students whose older versions, still shown by
+        attendance rows, match. Callers must then check the rows themselves.
+        """
+        needle = (query_text or '').strip().lower()
+        if not needle:
+            return []
+        if not self._built:
+            self.rebuild()
+        with self._lock:
+            self.searches += 1
+            matches = self._matching_ids(needle)[0]
+            if include_snapshots:
+                matches.update(student_id for student_id, versions in self._snapshots.items()
+                               if any(needle in (getattr(version, field) or '').lower()
+                                      for version in versions for field in SEARCH_FIELDS))
+            return sorted(matches)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'students': len(self._students),
+                'trigrams': len(self._grams),
+                'prefix_keys': len(self._prefixes),
+                'snapshots': sum(len(versions) for versions in self._snapshots.values()),
+                'rebuilds': self.rebuilds,
+                'searches': self.searches
+            }
+
+    def _matching_ids(self, needle):
+        """(all matching ids, ids whose year_level or course starts with needle)"""
+        matches = set()
+        prefixed = set()
+        for field in VALUE_FIELDS:
+            for value, ids in self._values[field].items():
+                if needle in value:
+                    matches |= ids
+                    if value.startswith(needle):
+                        prefixed |= ids
+
+        if len(needle) >= 3:
+            postings = sorted((self._grams.get(gram, ()) for gram in trigrams(needle)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:]) if postings[0] else set()
+        else:
+            # Too short for a trigram: every gram containing it, plus values shorter than a gram
+            candidates = set(self._short)
+            for gram, ids in self._grams.items():
+                if needle in gram:
+                    candidates |= ids
+        for student_id in candidates - matches:
+            student = self._students[student_id]
+            if any(needle in getattr(student, field).lower() for field in GRAM_FIELDS):
+                matches.add(student_id)
+        return matches, prefixed
+
+    def _index(self, student, grams, short, values):
+        for field in GRAM_FIELDS:
+            text = (getattr(student, field) or '').lower()
+            if len(text) < 3:
+                short.add(student.student_id)
+            for gram in trigrams(text):
+                grams.setdefault(gram, set()).add(student.student_id)
+        for field in VALUE_FIELDS:
+            values[field].setdefault((getattr(student, field) or '').lower(), set()).add(student.student_id)
+
+    def _unindex(self, student):
+        for field in GRAM_FIELDS:
+            for gram in trigrams((getattr(student, field) or '').lower()):
+                ids = self._grams.get(gram)
+                if ids is not None:
+                    ids.discard(student.student_id)
+                    if not ids:
+                        del self._grams[gram]
+        self._short.discard(student.student_id)
+        for field in VALUE_FIELDS:
+            key = (getattr(student, field) or '').lower()
+            ids = self._values[field].get(key)
+            if ids is not None:
+                ids.discard(student.student_id)
+                if not ids:
+                    del self._values[field][key]
+
+    def _unprefix(self, student):
+        for key in prefix_keys(student):
+            position = bisect_left(self._prefixes, (key, student.student_id))
+            if position < len(self._prefixes) and self._prefixes[position] == (key, student.student_id):
+                del self._prefixes[position]
+
+    def _apply(self, changes):
+        with self._lock:
+            if not self._built:
+                return
+            for student_id, student in changes.items():
+                old = self._students.pop(student_id, None)
+                if old is not None:
+                    self._unindex(old)
+                    self._unprefix(old)
+                if student is None:
+                    self._snapshots.pop(student_id, None)
+                    continue
+                if old is not None and old[1:] != student[1:]:
+                    # Attendance rows written before the change still show the old version
+                    self._snapshots.setdefault(student_id, set()).add(old)
+                self._students[student_id] = student
+                self._index(student, self._grams, self._short, self._values)
+                for key in prefix_keys(student):
+                    insort(self._prefixes, (key, student_id))
+
+    def _after_flush(self, session, flush_context):
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, Student):
+                session.info.setdefault(SESSION_KEY, {})[obj.student_id] = \
+                    CachedStudent(obj.student_id, obj.fname, obj.year_level, obj.course)
+        for obj in session.deleted:
+            if isinstance(obj, Student):
+                session.info.setdefault(SESSION_KEY, {})[obj.student_id] = None
+
+    def _after_commit(self, session):
+        changes = session.info.pop(SESSION_KEY, None)
+        if changes:
+            self._apply(changes)
+
+    def _after_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(SESSION_KEY, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                with self.app.app_context():
+                    self.rebuild()
+                    db.session.remove()
+            except Exception as e:
+                self.app.logger.warning(f'Student search index refresh failed: {e}')
+
+
+student_search = StudentSearchIndex()
@@ -9,6 +9,8 @@ import os
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
+# DatabaseManager lives with the GUI version
+sys.path.insert(0, os.path.join(current_dir, 'gui_version'))
 
 try:
     from database import DatabaseManager
@@ -22,7 +24,7 @@ try:
     
     db = DatabaseManager()
     
-    print("Creating database tables...")
+    print("Creating database tables and indexes...")
     db.create_tables()
     
     print("Importing sample student data...")
@@ -37,6 +39,7 @@ try:
     
     print("\n🎉 Database setup completed successfully!")
     print("You can now run the application with: python run.py")
+    print("For an existing web database, add missing indexes with: python migrate_database.py")
     
 except ImportError as e:
     print(f"Import Error: {e}")